@@ -0,0 +1,90 @@
+"""
+Accuracy vs speed of detector striding (DETECT_STRIDE) on reference clips.
+
+Every clip is first run with the detector on every frame; that run is the
+reference the strided runs are scored against (IN/OUT count error and
+share of detector calls saved).
+
+Run from backend/:
+    python -m benchmarks.detect_stride data/input_vids/gate_a.mp4 data/input_vids/gate_b.mp4
+"""
+import argparse
+import time
+
+import cv2
+
+import config
+from core.counter import TempleCounter
+from core.registry import registry
+
+# (label, DETECT_STRIDE, gate band, max shift, dense tracks); the first row is the reference
+SETTINGS = [
+    ("every frame", 1, 0, 0, 0),
+    ("stride 2", 2, 0, 0, 0),
+    ("stride 3", 3, 0, 0, 0),
+    ("stride 5", 5, 0, 0, 0),
+    ("adaptive 3", 3, config.DETECT_GATE_BAND_PX, config.DETECT_MAX_SHIFT_PX, config.DETECT_DENSE_TRACKS),
+    ("adaptive 5", 5, config.DETECT_GATE_BAND_PX, config.DETECT_MAX_SHIFT_PX, config.DETECT_DENSE_TRACKS),
+    ("adaptive 8", 8, config.DETECT_GATE_BAND_PX, config.DETECT_MAX_SHIFT_PX, config.DETECT_DENSE_TRACKS),
+]
+
+
+def _run_clip(video_path, max_frames):
+    engine = TempleCounter(detector=registry.detector(), gender_session=registry.gender_session())
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    t0 = time.perf_counter()
+    try:
+        while frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            _, _, in_count, out_count = engine.analyze_frame(frame, frames)
+            frames += 1
+    finally:
+        cap.release()
+    elapsed = time.perf_counter() - t0
+    return {
+        "frames": frames,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "detect_pct": 100.0 * engine.counter.detector_calls / max(frames, 1),
+        "in": in_count if frames else 0,
+        "out": out_count if frames else 0,
+    }
+
+
+def run(video_paths, max_frames):
+    registry.load()
+    saved = (config.DETECT_STRIDE, config.DETECT_GATE_BAND_PX, config.DETECT_MAX_SHIFT_PX, config.DETECT_DENSE_TRACKS)
+    rows = []
+    try:
+        for path in video_paths:
+            reference = None
+            for label, stride, band, shift, dense in SETTINGS:
+                config.DETECT_STRIDE = stride
+                config.DETECT_GATE_BAND_PX = band
+                config.DETECT_MAX_SHIFT_PX = shift
+                config.DETECT_DENSE_TRACKS = dense
+                row = dict(_run_clip(path, max_frames), clip=path, setting=label)
+                if reference is None:
+                    reference = row
+                row["speedup"] = row["fps"] / reference["fps"] if reference["fps"] else 0.0
+                row["count_error"] = abs(row["in"] - reference["in"]) + abs(row["out"] - reference["out"])
+                rows.append(row)
+    finally:
+        config.DETECT_STRIDE, config.DETECT_GATE_BAND_PX, config.DETECT_MAX_SHIFT_PX, config.DETECT_DENSE_TRACKS = saved
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--max-frames", type=int, default=3000)
+    args = parser.parse_args()
+
+    print(f"{'clip':<30} | {'setting':<11} | {'fps':>6} | {'speedup':>7} | {'detect %':>8} | {'IN':>4} | {'OUT':>4} | {'error':>5}")
+    for row in run(args.videos, args.max_frames):
+        print(
+            f"{row['clip'][-30:]:<30} | {row['setting']:<11} | {row['fps']:>6.1f} | {row['speedup']:>6.2f}x | "
+            f"{row['detect_pct']:>7.1f}% | {row['in']:>4} | {row['out']:>4} | {row['count_error']:>5}"
+        )
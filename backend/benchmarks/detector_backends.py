@@ -0,0 +1,165 @@
+"""
+Accuracy and throughput of the detector backends (DETECTOR_BACKEND) on reference clips.
+
+PyTorch FP32 is the reference. Every backend runs the clips through
+TempleCounter.process_frame, the way jobs do, and the report gives its
+detect + track latency and FPS on detected frames (decode excluded),
+agreement of its tracked person boxes with the reference (precision/recall
+of IoU >= 0.5 matches) and the IN/OUT counts with their error against the
+reference. Backends whose runtime is not installed (e.g. openvino, nncf)
+are reported as unavailable. INT8 rows calibrate on the first clip unless
+DETECTOR_CALIBRATION_VIDEO is set.
+
+Run from backend/:
+    python -m benchmarks.detector_backends data/input_vids/gate_a.mp4 data/input_vids/gate_b.mp4
+    python -m benchmarks.detector_backends data/input_vids/gate.mp4 --intra 4 --inter 1
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+import config
+from core.counter import TempleCounter
+from core.detector import DetectorPredictor, export_detector, load_detector
+from core.registry import registry
+
+# (label, DETECTOR_BACKEND, DETECTOR_INT8); the first row is the reference
+VARIANTS = [
+    ("torch fp32", "torch", False),
+    ("onnx fp32", "onnx", False),
+    ("onnx int8", "onnx", True),
+    ("openvino fp32", "openvino", False),
+    ("openvino int8", "openvino", True),
+]
+MATCH_IOU = 0.5
+
+
+def _frames(video_path, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        for _ in range(max_frames):
+            ret, frame = cap.read()
+            if not ret:
+                return
+            yield frame
+    finally:
+        cap.release()
+
+
+def _run_clips(backend, int8, video_paths, max_frames):
+    """
+    Tracked person boxes per frame, per-frame detect + track latency (ms) on
+    detected frames and total IN/OUT counts, from counting every clip.
+    """
+    boxes, latencies = [], []
+    total_in = total_out = 0
+    for path in video_paths:
+        engine = TempleCounter(detector=load_detector(backend, int8), gender_session=registry.gender_session())
+        in_count = out_count = 0
+        clip_latencies = []
+        for frame_idx, frame in enumerate(_frames(path, max_frames)):
+            detected = engine.should_detect(frame_idx)
+            _, in_count, out_count = engine.process_frame(frame, frame_idx)
+            if frame_idx == 0 and not isinstance(engine.counter.model.predictor, DetectorPredictor):
+                raise RuntimeError(
+                    f"counter runs {type(engine.counter.model.predictor).__name__}, not DetectorPredictor"
+                )
+            if detected:
+                clip_latencies.append(engine.counter.profilers[0].dt * 1000)
+            boxes.append(np.asarray(engine.counter.boxes, dtype=np.float32).reshape(-1, 4))
+        latencies.extend(clip_latencies[1:])  # first call includes lazy setup
+        total_in += in_count
+        total_out += out_count
+    return boxes, np.array(latencies or [np.nan]), total_in, total_out
+
+
+def _iou(a, b):
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def _agreement(boxes, reference):
+    """Precision and recall of `boxes` against the reference boxes, greedy one-to-one IoU matching."""
+    matched = found = expected = 0
+    for pred, ref in zip(boxes, reference):
+        found += len(pred)
+        expected += len(ref)
+        if not len(pred) or not len(ref):
+            continue
+        iou = _iou(pred, ref)
+        while True:
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[i, j] < MATCH_IOU:
+                break
+            matched += 1
+            iou[i, :] = 0
+            iou[:, j] = 0
+    precision = matched / found if found else 1.0
+    recall = matched / expected if expected else 1.0
+    return precision, recall
+
+
+def run(video_paths, max_frames, variants=VARIANTS):
+    registry.load()
+    rows = []
+    reference = None
+    for label, backend, int8 in variants:
+        row = {"backend": label}
+        try:
+            if int8:
+                export_detector(backend, int8, calibration_video=config.DETECTOR_CALIBRATION_VIDEO or video_paths[0])
+            boxes, latencies, in_count, out_count = _run_clips(backend, int8, video_paths, max_frames)
+        except Exception as e:
+            row["error"] = f"unavailable: {type(e).__name__}: {e}"
+            rows.append(row)
+            continue
+
+        if reference is None:
+            reference = {"boxes": boxes, "fps": 1000 / latencies.mean(), "in": in_count, "out": out_count}
+        precision, recall = _agreement(boxes, reference["boxes"])
+        fps = 1000 / latencies.mean()
+        row.update({
+            "ms_p50": float(np.percentile(latencies, 50)),
+            "ms_p90": float(np.percentile(latencies, 90)),
+            "fps": fps,
+            "speedup": fps / reference["fps"],
+            "precision": precision,
+            "recall": recall,
+            "in": in_count,
+            "out": out_count,
+            "count_error": abs(in_count - reference["in"]) + abs(out_count - reference["out"]),
+        })
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--max-frames", type=int, default=500, help="frames per clip")
+    parser.add_argument("--backends", nargs="+", default=[label for label, _, _ in VARIANTS],
+                        help="subset of: " + ", ".join(f"'{label}'" for label, _, _ in VARIANTS))
+    parser.add_argument("--intra", type=int, default=config.DETECTOR_INTRA_OP_THREADS, help="intra-op threads")
+    parser.add_argument("--inter", type=int, default=config.DETECTOR_INTER_OP_THREADS, help="inter-op threads")
+    args = parser.parse_args()
+    config.DETECTOR_INTRA_OP_THREADS, config.DETECTOR_INTER_OP_THREADS = args.intra, args.inter
+
+    variants = [variant for variant in VARIANTS if variant[0] in args.backends]
+    print(
+        f"{'backend':<13} | {'p50 ms':>7} | {'p90 ms':>7} | {'fps':>6} | {'speedup':>7} | "
+        f"{'prec':>5} | {'recall':>6} | {'IN':>4} | {'OUT':>4} | {'error':>5}"
+    )
+    for row in run(args.videos, args.max_frames, variants):
+        if "error" in row:
+            print(f"{row['backend']:<13} | {row['error']}")
+            continue
+        print(
+            f"{row['backend']:<13} | {row['ms_p50']:>7.1f} | {row['ms_p90']:>7.1f} | {row['fps']:>6.1f} | "
+            f"{row['speedup']:>6.2f}x | {row['precision']:>5.3f} | {row['recall']:>6.3f} | "
+            f"{row['in']:>4} | {row['out']:>4} | {row['count_error']:>5}"
+        )
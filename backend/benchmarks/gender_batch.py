@@ -0,0 +1,87 @@
+"""
+Gender classifier throughput: per-crop get_gender vs batched get_genders.
+
+Run from backend/:
+    python -m benchmarks.gender_batch --model convnext_tiny_gender_82.44acc.onnx
+"""
+import argparse
+import time
+
+import numpy as np
+
+import config
+from core.gender import GenderClassifier
+
+DENSITIES = [1, 5, 10, 20, 30, 50]
+
+
+def _make_crops(rng, n_tracks):
+    # Person-shaped crops with CCTV-like size variation
+    crops = {}
+    for tid in range(n_tracks):
+        h = int(rng.integers(90, 320))
+        w = max(24, int(h * rng.uniform(0.3, 0.5)))
+        crops[tid] = rng.integers(0, 256, size=(h, w, 3), dtype=np.uint8)
+    return crops
+
+
+def _new_classifier(model_path, max_batch):
+    # required_votes is set high so no track ever locks in: every call infers
+    return GenderClassifier(
+        model_path=model_path,
+        required_votes=10**9,
+        stale_timeout=config.STALE_TRACK_TIMEOUT,
+        confidence_thresh=config.GENDER_CONF_THRESH,
+        device=config.DEVICE,
+        max_batch_size=max_batch,
+    )
+
+
+def run(model_path, frames, max_batch, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    for n_tracks in DENSITIES:
+        crops = _make_crops(rng, n_tracks)
+
+        per_crop = _new_classifier(model_path, max_batch)
+        if per_crop.session is None:
+            raise SystemExit("Gender model could not be loaded; nothing to benchmark.")
+        per_crop.get_gender(0, crops[0], 0)  # warm-up
+        t0 = time.perf_counter()
+        for f in range(frames):
+            for tid, crop in crops.items():
+                per_crop.get_gender(tid, crop, f)
+        per_crop_s = time.perf_counter() - t0
+
+        batched = _new_classifier(model_path, max_batch)
+        batched.get_genders(crops, 0)  # warm-up
+        t0 = time.perf_counter()
+        for f in range(frames):
+            batched.get_genders(crops, f)
+        batched_s = time.perf_counter() - t0
+
+        total = frames * n_tracks
+        rows.append({
+            "tracks": n_tracks,
+            "per_crop_crops_s": total / per_crop_s,
+            "batched_crops_s": total / batched_s,
+            "speedup": per_crop_s / batched_s,
+        })
+
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=config.GENDER_MODEL_PATH)
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--max-batch", type=int, default=config.GENDER_MAX_BATCH)
+    args = parser.parse_args()
+
+    print(f"{'tracks':>6} | {'per-crop crops/s':>16} | {'batched crops/s':>15} | {'speedup':>7}")
+    for row in run(args.model, args.frames, args.max_batch):
+        print(
+            f"{row['tracks']:>6} | {row['per_crop_crops_s']:>16.1f} | "
+            f"{row['batched_crops_s']:>15.1f} | {row['speedup']:>6.2f}x"
+        )
@@ -0,0 +1,179 @@
+"""
+Build the INT8 gender model and check it against the FP32 one.
+
+Person crops for calibration and evaluation come from gate footage (--video,
+cropped with the configured detector) and/or a labeled folder (--labeled
+DIR with female/ and male/ subfolders of crop images). Calibration uses a
+share of the video crops; everything else is held out for the check:
+
+  agreement   same argmax as FP32
+  decision    same locked-in label (Female / Male / Unknown at GENDER_CONF_THRESH)
+  |dP|        mean absolute change of P(male)
+  accuracy    against the labels, for --labeled crops
+
+plus batched throughput (GenderClassifier.get_genders, crops/s) of both
+models with and without IO binding, using the GENDER_* session settings.
+The INT8 model is written next to the FP32 one as <name>.int8.onnx (load it
+with GENDER_INT8 = True) and removed again if agreement falls below
+--min-agreement.
+
+Run from backend/:
+    python -m benchmarks.gender_quant --video data/input_vids/gate.mp4
+    python -m benchmarks.gender_quant --video data/input_vids/gate.mp4 --labeled data/gender_crops --mode dynamic
+"""
+import argparse
+import glob
+import os
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import config
+from core.detector import load_detector
+from core.gender import GenderClassifier, create_gender_session, preprocess_crops, quantize_gender_model
+
+LABELS = {"female": 0, "male": 1}  # model output order
+
+
+def _video_crops(video_path, max_crops, frame_step=5, min_height=64):
+    detector = load_detector()
+    cap = cv2.VideoCapture(video_path)
+    crops = []
+    frame_idx = 0
+    try:
+        while len(crops) < max_crops:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_idx += 1
+            if frame_idx % frame_step:
+                continue
+            result = detector.predict(
+                frame, classes=config.TARGET_CLASSES, conf=config.CONF_THRESH, iou=config.IOU_THRESH, verbose=False,
+            )[0]
+            for x1, y1, x2, y2 in result.boxes.xyxy.cpu().numpy().astype(int):
+                if y2 - y1 >= min_height:
+                    crops.append(frame[max(0, y1):y2, max(0, x1):x2])
+    finally:
+        cap.release()
+    return crops[:max_crops]
+
+
+def _labeled_crops(root):
+    crops, labels = [], []
+    for name, label in LABELS.items():
+        for path in sorted(glob.glob(os.path.join(root, name, "*"))):
+            image = cv2.imread(path)
+            if image is not None:
+                crops.append(image)
+                labels.append(label)
+    return crops, np.array(labels)
+
+
+def _probs(session, batch, chunk=32):
+    name = session.get_inputs()[0].name
+    logits = np.concatenate([session.run(None, {name: batch[i:i + chunk]})[0] for i in range(0, len(batch), chunk)])
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _decisions(probs):
+    decided = np.where(probs[:, 1] > probs[:, 0], 1, 0)
+    return np.where(probs.max(axis=1) < config.GENDER_CONF_THRESH, -1, decided)
+
+
+def _throughput(model_path, crops, io_binding, frames=20):
+    session = create_gender_session(model_path, config.DEVICE)
+    crops = {tid: crop for tid, crop in enumerate(crops[:config.GENDER_MAX_BATCH])}
+    # required_votes is set high so no track ever locks in: every call infers
+    classifier = GenderClassifier(
+        model_path=model_path, required_votes=10**9, max_batch_size=config.GENDER_MAX_BATCH,
+        session=session, io_binding=io_binding,
+    )
+    classifier.get_genders(crops, 0)  # warm-up
+    t0 = time.perf_counter()
+    for f in range(frames):
+        classifier.get_genders(crops, f)
+    return frames * len(crops) / (time.perf_counter() - t0)
+
+
+def run(model_path, int8_path, video=None, labeled=None, mode="static", calib_crops=200, max_crops=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    video_crops = _video_crops(video, max_crops) if video else []
+    labeled_crops, labels = _labeled_crops(labeled) if labeled else ([], np.empty(0, dtype=int))
+    if not video_crops and not labeled_crops:
+        raise SystemExit("No person crops found; pass --video and/or --labeled.")
+
+    # Calibrate on video crops when there are any, keeping labeled crops for the check
+    pool = video_crops or labeled_crops
+    order = rng.permutation(len(pool))
+    n_calib = min(calib_crops, len(pool) // 2) if mode == "static" else 0
+    calib = [pool[i] for i in order[:n_calib]]
+    held_out = [pool[i] for i in order[n_calib:]]
+    if pool is labeled_crops:
+        labels = labels[order[n_calib:]]
+        eval_crops, eval_labels = held_out, labels
+    else:
+        eval_crops, eval_labels = held_out + labeled_crops, np.concatenate([np.full(len(held_out), -1), labels])
+
+    calibration = preprocess_crops(calib)[0] if calib else None
+    quantize_gender_model(model_path, int8_path, calibration)
+
+    batch, kept = preprocess_crops(eval_crops)
+    eval_labels = eval_labels[kept]
+    fp32 = _probs(create_gender_session(model_path), batch)
+    int8 = _probs(create_gender_session(int8_path), batch)
+
+    has_labels = eval_labels >= 0
+    report = {
+        "mode": mode,
+        "calibration_crops": len(calib),
+        "eval_crops": len(batch),
+        "agreement": float(np.mean(fp32.argmax(axis=1) == int8.argmax(axis=1))),
+        "decision_agreement": float(np.mean(_decisions(fp32) == _decisions(int8))),
+        "mean_abs_dp": float(np.mean(np.abs(fp32[:, 1] - int8[:, 1]))),
+        "labeled": int(has_labels.sum()),
+        "fp32_accuracy": float(np.mean(fp32[has_labels].argmax(axis=1) == eval_labels[has_labels])) if has_labels.any() else None,
+        "int8_accuracy": float(np.mean(int8[has_labels].argmax(axis=1) == eval_labels[has_labels])) if has_labels.any() else None,
+        "size_mb": {path: os.path.getsize(path) / 2**20 for path in (model_path, int8_path)},
+        "crops_per_s": {
+            f"{label}{' + io binding' if binding else ''}": _throughput(path, eval_crops, binding)
+            for label, path in (("fp32", model_path), ("int8", int8_path))
+            for binding in (False, True)
+        },
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=config.GENDER_MODEL_PATH)
+    parser.add_argument("--video", help="gate footage to take person crops from")
+    parser.add_argument("--labeled", help="folder with female/ and male/ crop images")
+    parser.add_argument("--mode", choices=("static", "dynamic"), default="static",
+                        help="static: calibrated QDQ (weights + activations); dynamic: MatMul/Gemm weights only")
+    parser.add_argument("--calib-crops", type=int, default=200)
+    parser.add_argument("--max-crops", type=int, default=1000, help="crops taken from --video")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="keep the INT8 model only above this")
+    args = parser.parse_args()
+
+    int8_path = str(Path(args.model).with_suffix(".int8.onnx"))
+    report = run(args.model, int8_path, args.video, args.labeled, args.mode, args.calib_crops, args.max_crops)
+
+    print(f"mode {report['mode']}: {report['calibration_crops']} calibration / {report['eval_crops']} held-out crops")
+    print(f"agreement {report['agreement']:.3f}, decision agreement {report['decision_agreement']:.3f}, "
+          f"mean |dP| {report['mean_abs_dp']:.4f}")
+    if report["labeled"]:
+        print(f"accuracy on {report['labeled']} labeled crops: fp32 {report['fp32_accuracy']:.3f}, "
+              f"int8 {report['int8_accuracy']:.3f}")
+    for path, size in report["size_mb"].items():
+        print(f"{path}: {size:.1f} MB")
+    for label, rate in report["crops_per_s"].items():
+        print(f"{label:<20} {rate:>8.1f} crops/s")
+
+    if report["agreement"] < args.min_agreement:
+        os.remove(int8_path)
+        raise SystemExit(f"INT8 agreement {report['agreement']:.3f} < {args.min_agreement}: removed {int8_path}")
+    print(f"Wrote {int8_path}; set GENDER_INT8 = True to use it.")
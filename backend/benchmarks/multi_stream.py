@@ -0,0 +1,104 @@
+"""
+Throughput of N streams counted one frame at a time vs with batched detection.
+
+"separate" runs one TempleCounter per stream, each calling the detector on
+its own frame; "batched" runs a MultiStreamCounter that detects all
+streams' frames in one forward pass per step. Both read the given clips
+round-robin (repeat one clip to simulate several identical cameras) and
+report aggregate frames per second (decode included in both) and IN/OUT
+per stream.
+
+Run from backend/:
+    python -m benchmarks.multi_stream data/input_vids/gate_a.mp4 data/input_vids/gate_b.mp4
+    python -m benchmarks.multi_stream data/input_vids/gate.mp4 --streams 4
+"""
+import argparse
+import time
+
+import cv2
+
+import config
+from core.counter import TempleCounter
+from core.multi import MultiStreamCounter
+from core.registry import registry
+
+
+def _steps(video_paths, max_frames):
+    """Yield one frame per stream per step, until any clip ends or after `max_frames` steps."""
+    caps = [cv2.VideoCapture(path) for path in video_paths]
+    try:
+        for _ in range(max_frames):
+            frames = []
+            for cap in caps:
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                frames.append(frame)
+            yield frames
+    finally:
+        for cap in caps:
+            cap.release()
+
+
+def _run_separate(video_paths, max_frames):
+    engines = [
+        TempleCounter(detector=registry.detector(), gender_session=registry.gender_session())
+        for _ in video_paths
+    ]
+    steps = 0
+    t0 = time.perf_counter()
+    for frame_idx, frames in enumerate(_steps(video_paths, max_frames)):
+        for engine, frame in zip(engines, frames):
+            engine.analyze_frame(frame, frame_idx)
+        steps += 1
+    elapsed = time.perf_counter() - t0
+    return steps, elapsed, [(e.counter.in_count, e.counter.out_count) for e in engines]
+
+
+def _run_batched(video_paths, max_frames):
+    engine = MultiStreamCounter(
+        [config.GATE_LINE] * len(video_paths),
+        detector=registry.detector(), gender_session=registry.gender_session(),
+    )
+    steps = 0
+    t0 = time.perf_counter()
+    for frame_idx, frames in enumerate(_steps(video_paths, max_frames)):
+        engine.analyze_frames({i: (frame_idx, frame) for i, frame in enumerate(frames)})
+        steps += 1
+    elapsed = time.perf_counter() - t0
+    return steps, elapsed, [(e.counter.in_count, e.counter.out_count) for e in engine.engines]
+
+
+def run(video_paths, streams, max_frames):
+    registry.load()
+    paths = [video_paths[i % len(video_paths)] for i in range(max(streams, len(video_paths)))]
+
+    rows = []
+    for label, runner in (("separate", _run_separate), ("batched", _run_batched)):
+        steps, elapsed, counts = runner(paths, max_frames)
+        frames = steps * len(paths)
+        rows.append({
+            "mode": label,
+            "streams": len(paths),
+            "frames": frames,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "counts": counts,
+        })
+    rows[1]["speedup"] = rows[1]["fps"] / rows[0]["fps"] if rows[0]["fps"] else 0.0
+    rows[0]["speedup"] = 1.0
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--streams", type=int, default=0, help="streams to simulate (default: one per clip)")
+    parser.add_argument("--max-frames", type=int, default=500, help="frames per stream")
+    args = parser.parse_args()
+
+    print(f"{'mode':<9} | {'streams':>7} | {'frames':>6} | {'fps':>7} | {'speedup':>7} | IN/OUT per stream")
+    for row in run(args.videos, args.streams, args.max_frames):
+        print(
+            f"{row['mode']:<9} | {row['streams']:>7} | {row['frames']:>6} | {row['fps']:>7.1f} | "
+            f"{row['speedup']:>6.2f}x | {row['counts']}"
+        )
@@ -0,0 +1,91 @@
+"""
+Counting parity across the ways a job can run, on reference clips.
+
+Counts must not depend on how a job runs: every clip is counted
+sequentially with the annotator drawing (render "full", the reference),
+without it (render "none", live jobs), and chunked across worker
+processes as `chunked` jobs are (CHUNK_* settings, --workers). Any
+difference in IN/OUT or male/female/unknown is reported and makes the run
+exit non-zero.
+
+Run from backend/:
+    python -m benchmarks.parity data/input_vids/gate_a.mp4 data/input_vids/gate_b.mp4
+"""
+import argparse
+
+import cv2
+
+import config
+from core.counter import TempleCounter
+from core.registry import registry
+from utils.chunked import run_chunked
+
+TALLIES = ("in_count", "out_count", "male", "female", "unknown")
+
+
+def _count(video_path, max_frames, draw):
+    engine = TempleCounter(detector=registry.detector(), gender_session=registry.gender_session(), draw=draw)
+    cap = cv2.VideoCapture(video_path)
+    frame_idx = 0
+    try:
+        while frame_idx < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            engine.analyze_frame(frame, frame_idx)
+            frame_idx += 1
+    finally:
+        cap.release()
+    engine.flush_pending_entries()
+    return dict(zip(TALLIES, (
+        engine.counter.in_count, engine.counter.out_count,
+        engine.male_count, engine.female_count, engine.unknown_count,
+    )))
+
+
+def _count_chunked(video_path, max_frames, workers):
+    cap = cv2.VideoCapture(video_path)
+    total_frames = min(max_frames, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    cap.release()
+    result = run_chunked(
+        video_path, total_frames, fps, config.GATE_LINE,
+        workers=workers,
+        overlap=int(config.CHUNK_OVERLAP_SECONDS * fps),
+        min_seconds=config.CHUNK_MIN_SECONDS,
+    )
+    return {key: result[key] for key in TALLIES}, len(result["segments"])
+
+
+def _row(tallies, reference, clip, mode):
+    return dict(tallies, clip=clip, mode=mode, mismatch=[key for key in TALLIES if tallies[key] != reference[key]])
+
+
+def run(video_paths, max_frames, workers=config.CHUNK_WORKERS):
+    registry.load()
+    rows = []
+    for path in video_paths:
+        reference = _count(path, max_frames, draw=True)
+        rows.append(_row(reference, reference, path, "full"))
+        rows.append(_row(_count(path, max_frames, draw=False), reference, path, "no render"))
+        tallies, segments = _count_chunked(path, max_frames, workers)
+        rows.append(_row(tallies, reference, path, f"chunked/{segments}"))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--max-frames", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=config.CHUNK_WORKERS, help="chunked worker processes")
+    args = parser.parse_args()
+
+    rows = run(args.videos, args.max_frames, args.workers)
+    print(f"{'clip':<30} | {'mode':<10} | {'IN':>4} | {'OUT':>4} | {'male':>4} | {'fem':>4} | {'unk':>4} | mismatch")
+    for row in rows:
+        print(
+            f"{row['clip'][-30:]:<30} | {row['mode']:<10} | {row['in_count']:>4} | {row['out_count']:>4} | "
+            f"{row['male']:>4} | {row['female']:>4} | {row['unknown']:>4} | {', '.join(row['mismatch']) or '-'}"
+        )
+    if any(row["mismatch"] for row in rows):
+        raise SystemExit("Counts differ between modes")
@@ -0,0 +1,306 @@
+"""
+Benchmark suite: per-stage latency, throughput and peak memory of the counting pipeline.
+
+Sections:
+  pipeline     decode -> TempleCounter.process_frame -> encode, one thread,
+               with per-stage percentiles (decode, detect_track,
+               crop_preprocess, gender_onnx, annotate, write)
+  gender       GenderClassifier.get_genders on synthetic person crops
+  calibration  auto_calibrate_gate
+  codec        decode-only and encode-only throughput
+
+Without --video a synthetic clip is generated (timings only; the detector
+finds nobody in it, so use recorded gate footage for realistic numbers).
+Results are written as JSON so runs on different commits can be compared.
+
+Run from backend/:
+    python -m benchmarks.suite --video data/input_vids/gate.mp4
+    python -m benchmarks.suite --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import config
+from calibrate import auto_calibrate_gate
+from core.counter import TempleCounter
+from core.detector import detector_path
+from core.gender import GenderClassifier, gender_model_path
+from core.registry import registry
+from utils.profiling import StageProfiler
+from utils.video_io import open_video_encoder
+
+SECTIONS = ("pipeline", "gender", "calibration", "codec")
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS; process-wide and monotonic
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_synthetic_clip(path, frames=300, width=1280, height=720, fps=25, seed=0):
+    """Noise background with person-sized blobs walking across a fixed gate."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+    walkers = [(rng.uniform(0, width), rng.uniform(-height, 0), rng.uniform(2, 6)) for _ in range(12)]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for f in range(frames):
+        frame = background.copy()
+        for x, y0, speed in walkers:
+            y = int((y0 + speed * f) % (height + 200)) - 100
+            cv2.rectangle(frame, (int(x), y), (int(x) + 50, y + 140), (30, 30, 30), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def bench_pipeline(video_path, max_frames, out_path):
+    profiler = StageProfiler()
+    engine = TempleCounter(
+        detector=registry.detector(), gender_session=registry.gender_session(), profiler=profiler,
+    )
+    cap = cv2.VideoCapture(video_path)
+    w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 25
+    writer, _ = open_video_encoder(
+        out_path, w, h, fps,
+        backend=config.VIDEO_ENCODER, preset=config.ENCODER_PRESET,
+        crf=config.ENCODER_CRF, fragmented=config.ENCODER_FRAGMENTED,
+    )
+
+    frames = 0
+    t0 = time.perf_counter()
+    try:
+        while frames < max_frames:
+            frame_t0 = time.perf_counter()
+            with profiler.stage("decode"):
+                ret, frame = cap.read()
+            if not ret:
+                break
+            annotated, _, _ = engine.process_frame(frame, frames)
+            with profiler.stage("write"):
+                writer.write(annotated)
+            profiler.add("frame", time.perf_counter() - frame_t0)
+            profiler.end_frame()
+            frames += 1
+    finally:
+        cap.release()
+        writer.release()
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "frames": frames,
+        "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": profiler.summary(),
+        "in_count": engine.counter.in_count,
+        "out_count": engine.counter.out_count,
+        "gender_stats": engine.gender_classifier.get_stats(),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def bench_gender(calls, tracks, seed=0):
+    rng = np.random.default_rng(seed)
+    crops = {}
+    for tid in range(tracks):
+        ch = int(rng.integers(90, 320))
+        cw = max(24, int(ch * rng.uniform(0.3, 0.5)))
+        crops[tid] = rng.integers(0, 256, size=(ch, cw, 3), dtype=np.uint8)
+
+    profiler = StageProfiler()
+    # required_votes is set high so no track ever locks in: every call infers
+    classifier = GenderClassifier(
+        model_path=gender_model_path(),
+        required_votes=10**9,
+        stale_timeout=config.STALE_TRACK_TIMEOUT,
+        confidence_thresh=config.GENDER_CONF_THRESH,
+        device=config.DEVICE,
+        max_batch_size=config.GENDER_MAX_BATCH,
+        session=registry.gender_session(),
+        profiler=profiler,
+        io_binding=config.GENDER_IO_BINDING,
+    )
+    if classifier.session is None:
+        return {"skipped": "gender model not loaded"}
+    classifier.get_genders(crops, 0)  # warm-up
+    profiler.reset()
+
+    t0 = time.perf_counter()
+    for f in range(calls):
+        with profiler.stage("get_genders"):
+            classifier.get_genders(crops, f)
+        profiler.end_frame()
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "tracks": tracks,
+        "calls": calls,
+        "crops_per_s": round(calls * tracks / elapsed, 1) if elapsed > 0 else 0.0,
+        "stages": profiler.summary(),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def bench_calibration(video_path, frames):
+    t0 = time.perf_counter()
+    result = auto_calibrate_gate(video_path, frames_to_analyze=frames, model=registry.detector())
+    elapsed = time.perf_counter() - t0
+    analyzed = result.get("frames_analyzed", frames)
+    return {
+        "frames": analyzed,
+        "wall_s": round(elapsed, 3),
+        "fps": round(analyzed / elapsed, 2) if elapsed > 0 else 0.0,
+        "status": result.get("status"),
+        "stopped": result.get("stopped"),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def bench_codec(video_path, max_frames, out_path):
+    profiler = StageProfiler()
+    cap = cv2.VideoCapture(video_path)
+    first = None
+    frames = 0
+    while frames < max_frames:
+        with profiler.stage("decode"):
+            ret, frame = cap.read()
+        if not ret:
+            break
+        profiler.end_frame()
+        if first is None:
+            first = frame
+        frames += 1
+    cap.release()
+
+    if first is not None:
+        h, w = first.shape[:2]
+        writer, browser_ready = open_video_encoder(
+            out_path, w, h, 25,
+            backend=config.VIDEO_ENCODER, preset=config.ENCODER_PRESET,
+            crf=config.ENCODER_CRF, fragmented=config.ENCODER_FRAGMENTED,
+        )
+        for _ in range(frames):
+            with profiler.stage("write"):
+                writer.write(first)
+            profiler.end_frame()
+        with profiler.stage("finalize"):
+            writer.release()
+        profiler.end_frame()
+
+    stages = profiler.summary()
+    return {
+        "frames": frames,
+        "encoder": config.VIDEO_ENCODER if first is not None and browser_ready else "opencv",
+        "decode_fps": round(1000.0 / stages["decode"]["mean_ms"], 1) if "decode" in stages else 0.0,
+        "encode_fps": round(1000.0 / stages["write"]["mean_ms"], 1) if "write" in stages else 0.0,
+        "stages": stages,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run(video_path=None, max_frames=300, sections=SECTIONS, gender_calls=200, gender_tracks=10):
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic = video_path is None
+        if synthetic:
+            video_path = make_synthetic_clip(os.path.join(tmp, "synthetic.mp4"), frames=max_frames)
+
+        registry.load()
+        results = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "device": config.DEVICE,
+                "detector": detector_path(),
+                "gender_model": gender_model_path(),
+                "video": "synthetic" if synthetic else video_path,
+                "max_frames": max_frames,
+            },
+        }
+        if "pipeline" in sections:
+            results["pipeline"] = bench_pipeline(video_path, max_frames, os.path.join(tmp, "pipeline.mp4"))
+        if "gender" in sections:
+            results["gender"] = bench_gender(gender_calls, gender_tracks)
+        if "calibration" in sections:
+            results["calibration"] = bench_calibration(video_path, max_frames)
+        if "codec" in sections:
+            results["codec"] = bench_codec(video_path, max_frames, os.path.join(tmp, "codec.mp4"))
+    return results
+
+
+def compare(before, after):
+    """Print p50/p90 and throughput changes between two result files."""
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    print(f"{'section':<12} | {'metric':<24} | {'before':>10} | {'after':>10} | {'change':>8}")
+
+    def row(section, metric, old, new):
+        change = f"{100.0 * (new - old) / old:+.1f}%" if old else "n/a"
+        print(f"{section:<12} | {metric:<24} | {old:>10.3f} | {new:>10.3f} | {change:>8}")
+
+    for section in SECTIONS:
+        old, new = before.get(section), after.get(section)
+        if not old or not new:
+            continue
+        for key in ("fps", "crops_per_s", "decode_fps", "encode_fps", "peak_rss_mb"):
+            if key in old and key in new:
+                row(section, key, old[key], new[key])
+        for stage, stats in old.get("stages", {}).items():
+            if stage in new.get("stages", {}):
+                for pct in ("p50_ms", "p90_ms"):
+                    row(section, f"{stage} {pct}", stats[pct], new["stages"][stage][pct])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="recorded clip (default: generate a synthetic one)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--gender-calls", type=int, default=200)
+    parser.add_argument("--gender-tracks", type=int, default=10)
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            compare(json.load(f_before), json.load(f_after))
+        sys.exit(0)
+
+    results = run(args.video, args.frames, args.sections, args.gender_calls, args.gender_tracks)
+    out = args.out or os.path.join(
+        "benchmarks", "results",
+        f"{results['meta']['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for section in SECTIONS:
+        for stage, stats in results.get(section, {}).get("stages", {}).items():
+            print(
+                f"{section:<12} {stage:<16} p50 {stats['p50_ms']:>8.2f} ms  "
+                f"p90 {stats['p90_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms"
+            )
+    if "pipeline" in results:
+        print(f"pipeline fps {results['pipeline']['fps']}, peak RSS {results['pipeline']['peak_rss_mb']} MB")
+    print(f"Results written to {out}")
@@ -1,15 +1,100 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import config
+from core.detector import load_detector
+from core.tracks import StaleTrackHeap
 
-def auto_calibrate_gate(video_path, frames_to_analyze=400):
+class FlowEstimate:
     """
+    Running statistics of crowd motion for gate calibration, in constant memory.
+
+    Motion vectors are folded into a count, mean and 2x2 scatter matrix
+    (batched Welford / Chan update) and anchor points into a count and sum,
+    so the PCA over everything seen so far is one 2x2 eigendecomposition,
+    available after every frame.
+    """
+
+    def __init__(self):
+        self.vectors = 0
+        self.mean = np.zeros(2)
+        self.scatter = np.zeros((2, 2))
+        self.anchors = 0
+        self.anchor_sum = np.zeros(2)
+
+    def add_anchors(self, points):
+        self.anchors += len(points)
+        self.anchor_sum += points.sum(axis=0)
+
+    def add_vectors(self, vectors):
+        m = len(vectors)
+        if not m:
+            return
+        batch_mean = vectors.mean(axis=0)
+        centered = vectors - batch_mean
+        delta = batch_mean - self.mean
+        total = self.vectors + m
+        self.scatter += centered.T @ centered + np.outer(delta, delta) * (self.vectors * m / total)
+        self.mean += delta * (m / total)
+        self.vectors = total
+
+    @property
+    def center(self):
+        return self.anchor_sum / max(self.anchors, 1)
+
+    def principal(self):
+        """(major/minor eigenvalue ratio, unit flow direction) of the motion covariance."""
+        eigenvalues, eigenvectors = np.linalg.eigh(self.scatter / max(self.vectors, 1))
+        return eigenvalues[1] / (eigenvalues[0] + 1e-6), eigenvectors[:, 1]
+
+
+def _axis_angle(direction):
+    """Flow axis in degrees, [0, 180): a vector and its opposite are the same axis."""
+    return float(np.degrees(np.arctan2(direction[1], direction[0])) % 180.0)
+
+
+def _angle_gap(a, b):
+    gap = abs(a - b) % 180.0
+    return min(gap, 180.0 - gap)
+
+
+def _converged(checks, reject_ratio):
+    """'chaotic' / 'converged' when the last checks agree on it, else None."""
+    if all(c["ratio"] < reject_ratio for c in checks):
+        return "chaotic"
+    last = checks[-1]
+    ratios = [c["ratio"] for c in checks]
+    if (
+        all(_angle_gap(c["angle"], last["angle"]) <= config.CALIBRATION_STABLE_DEG for c in checks)
+        and max(ratios) <= min(ratios) * (1 + config.CALIBRATION_STABLE_RATIO)
+        and all(np.hypot(c["center"][0] - last["center"][0], c["center"][1] - last["center"][1])
+                <= config.CALIBRATION_STABLE_PX for c in checks)
+    ):
+        return "converged"
+    return None
+
+
+def auto_calibrate_gate(video_path, frames_to_analyze=400, model=None, track_cache=None):
+    """
+    `model` lets the caller supply the YOLO instance to track with (e.g. the
+    one inside TempleCounter, so its tracker state carries on into the main
+    pass). If `track_cache` is a list, the tracked boxes of every analysed
+    frame are appended to it (None for frames without tracks) so the main
+    pass can replay them instead of running the detector again.
+
+    Motion is accumulated in a FlowEstimate and checked every
+    CALIBRATION_CHECK_EVERY frames; calibration stops before
+    `frames_to_analyze` once CALIBRATION_STABLE_CHECKS checks in a row agree
+    on the flow direction, eigenvalue ratio and gate centre, or all read as
+    chaotic.
+
     Returns a dict with:
       - 'status': 'success' | 'low_frame_count' | 'chaotic_motion' | 'chaotic_motion_warn'
       - 'gate_line': [(x1,y1), (x2,y2)] or None
       - 'ratio': float or None
       - 'vectors_found': int
+      - 'frames_analyzed': int
+      - 'stopped': 'converged' | 'chaotic' | 'frame_limit' | 'end_of_video'
+      - 'trace': [{frame, vectors, ratio, angle, center}] per convergence check
       - 'message': str (technical)
       - 'layman': str (user-friendly)
     """
@@ -17,23 +102,25 @@ def auto_calibrate_gate(video_path, frames_to_analyze=400):
     REJECT_RATIO = 1.5
     WARN_RATIO = 3.0
 
-    model = YOLO(config.MODEL_PATH)
-    if config.DEVICE == "cuda":
-        model.to("cuda")
+    if model is None:
+        model = load_detector()
 
     cap = cv2.VideoCapture(video_path)
     width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-    anchor_points = []
-    motion_vectors = []
-    track_history = {} 
-    
+    flow = FlowEstimate()
+    track_history = {}          # tid -> (anchor_x, anchor_y, last_frame)
+    expiry = StaleTrackHeap(config.STALE_TRACK_TIMEOUT)
+    trace = []
+    stopped = "frame_limit"
+
     frame_count = 0
 
     while frame_count < frames_to_analyze:
         ret, frame = cap.read()
         if not ret:
+            stopped = "end_of_video"
             break
 
         results = model.track(
@@ -46,51 +133,73 @@ def auto_calibrate_gate(video_path, frames_to_analyze=400):
             verbose=False
         )
 
-        if results[0].boxes is not None and results[0].boxes.id is not None:
+        has_tracks = results[0].boxes is not None and results[0].boxes.id is not None
+        if track_cache is not None:
+            track_cache.append(results[0].boxes.cpu() if has_tracks else None)
+
+        if has_tracks:
             boxes = results[0].boxes.xyxy.cpu().numpy()
             track_ids = results[0].boxes.id.int().cpu().tolist()
 
-            for box, track_id in zip(boxes, track_ids):
-                x1, y1, x2, y2 = box
-                anchor_x = int((x1 + x2) / 2)
-                anchor_y = int(y2)
-                
-                anchor_points.append([anchor_x, anchor_y])
-                
-                if track_id in track_history:
-                    prev_x, prev_y = track_history[track_id]
-                    dx = anchor_x - prev_x
-                    dy = anchor_y - prev_y
-                    
-                    if abs(dx) > 2 or abs(dy) > 2:
-                        motion_vectors.append([dx, dy])
-                
-                track_history[track_id] = (anchor_x, anchor_y)
+            # Bottom-centre anchors, and motion since each known track's previous anchor
+            anchors = np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1).astype(np.int64)
+            flow.add_anchors(anchors)
+            prev = np.array([track_history.get(tid, (0, 0, -1)) for tid in track_ids], dtype=np.int64)
+            motion = anchors - prev[:, :2]
+            moving = (prev[:, 2] >= 0) & (np.abs(motion) > 2).any(axis=1)
+            flow.add_vectors(motion[moving].astype(np.float64))
+
+            for tid, (x, y) in zip(track_ids, anchors.tolist()):
+                track_history[tid] = (x, y, frame_count)
+                expiry.add(tid, frame_count)
+
+        for tid in expiry.expire(frame_count, lambda tid: track_history[tid][2] if tid in track_history else None):
+            del track_history[tid]
 
         frame_count += 1
 
+        if (
+            config.CALIBRATION_CHECK_EVERY > 0
+            and frame_count % config.CALIBRATION_CHECK_EVERY == 0
+            and flow.vectors >= MIN_VECTOR_THRESHOLD
+        ):
+            ratio, flow_dir = flow.principal()
+            center = flow.center
+            trace.append({
+                "frame": frame_count,
+                "vectors": flow.vectors,
+                "ratio": round(float(ratio), 3),
+                "angle": round(_axis_angle(flow_dir), 2),
+                "center": [round(float(center[0]), 1), round(float(center[1]), 1)],
+            })
+            if len(trace) >= config.CALIBRATION_STABLE_CHECKS:
+                verdict = _converged(trace[-config.CALIBRATION_STABLE_CHECKS:], REJECT_RATIO)
+                if verdict is not None:
+                    stopped = verdict
+                    break
+
     cap.release()
 
+    progress = {
+        "vectors_found": flow.vectors,
+        "frames_analyzed": frame_count,
+        "stopped": stopped,
+        "trace": trace,
+    }
+
     # FAIL-SAFE 1: Insufficient Data
-    if len(motion_vectors) < MIN_VECTOR_THRESHOLD:
+    if flow.vectors < MIN_VECTOR_THRESHOLD:
         return {
             "status": "chaotic_motion",
             "gate_line": None,
             "ratio": None,
-            "vectors_found": len(motion_vectors),
-            "message": f"Insufficient motion data. Found {len(motion_vectors)} vectors, required {MIN_VECTOR_THRESHOLD}.",
+            **progress,
+            "message": f"Insufficient motion data. Found {flow.vectors} vectors, required {MIN_VECTOR_THRESHOLD}.",
             "layman": "Not enough movement was detected in the video for the system to determine a reliable counting line. Try using a longer video with more visible foot traffic."
         }
 
-    spatial_data = np.array(anchor_points, dtype=np.float32)
-    spatial_mean = np.mean(spatial_data, axis=0)
-    center = (int(spatial_mean[0]), int(spatial_mean[1]))
-
-    motion_data = np.array(motion_vectors, dtype=np.float32)
-    _, eigenvectors, eigenvalues = cv2.PCACompute2(motion_data, np.empty((0)))
-
-    flow_dir = eigenvectors[0] 
-    ratio = eigenvalues[0][0] / (eigenvalues[1][0] + 1e-6)
+    center = (int(flow.center[0]), int(flow.center[1]))
+    ratio, flow_dir = flow.principal()
 
     # FAIL-SAFE 2: Chaotic Crowd Rejection
     if ratio < REJECT_RATIO:
@@ -98,7 +207,7 @@ def auto_calibrate_gate(video_path, frames_to_analyze=400):
             "status": "chaotic_motion",
             "gate_line": None,
             "ratio": float(ratio),
-            "vectors_found": len(motion_vectors),
+            **progress,
             "message": f"Crowd motion is too chaotic. Ratio {ratio:.2f} is below rejection threshold {REJECT_RATIO}.",
             "layman": "The crowd movement in this video is too random for the computer to draw a reliable counting line. Try a video with a clearer flow direction."
         }
@@ -118,8 +227,8 @@ def auto_calibrate_gate(video_path, frames_to_analyze=400):
         "status": "success",
         "gate_line": [pt1, pt2],
         "ratio": float(ratio),
-        "vectors_found": len(motion_vectors),
-        "message": f"Calibration successful. Ratio: {ratio:.2f}",
+        **progress,
+        "message": f"Calibration successful. Ratio: {ratio:.2f} after {frame_count} frames ({stopped})",
         "layman": "The system successfully determined the optimal counting line based on crowd flow patterns."
     }
 
@@ -7,26 +7,102 @@ OUTPUT_DIR = "data/output_vids"
 ANNOTATED_DIR = os.path.join(OUTPUT_DIR, "annotated_vids")
 LOG_DIR = os.path.join(OUTPUT_DIR, "logs")
 MODEL_DIR = "models"
+JOB_DB_PATH = os.path.join(OUTPUT_DIR, "jobs.sqlite3")  # None keeps jobs in memory only
+JOB_CACHE_SIZE = 200            # Finished jobs kept in memory (LRU beyond this)
+JOB_CACHE_TTL = 3600            # Seconds a finished job stays in memory
 
 # Calibration Constants
 AUTO_CALIBRATE = True
 MAX_CALIBRATION_FRAMES = 400
 CALIBRATION_FRACTION = 0.8
 MIN_FRAMES_FOR_CALIBRATION = 300
+CALIBRATION_REUSE_TRACKS = True  # Replay calibration tracks in the main pass instead of re-detecting
+CALIBRATION_CHECK_EVERY = 25     # Frames between convergence checks (0 = always run to the frame limit)
+CALIBRATION_STABLE_CHECKS = 3    # Stop early once this many checks in a row agree (or all read chaotic)...
+CALIBRATION_STABLE_DEG = 3.0     # ...on the flow direction within this many degrees
+CALIBRATION_STABLE_RATIO = 0.1   # ...on the eigenvalue ratio within this relative change
+CALIBRATION_STABLE_PX = 8        # ...and on the gate centre within this many pixels
 
 # Device Config
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
+# Pipeline Config
+MAX_CONCURRENT_JOBS = 2         # Jobs processed at once; the rest wait in the queue
+SSE_MAX_EVENT_RATE = 4          # Max status events per second per SSE client
+PIPELINE_QUEUE_SIZE = 8         # Frames buffered between decode / inference / encode threads
+METRICS_INTERVAL_S = 1.0        # How often job metrics (FPS, stage timings, ETA) are refreshed
+METRICS_WINDOW_FRAMES = 300     # Frames behind the rolling stage-timing percentiles
+METRICS_FPS_WINDOW_S = 10       # Seconds behind the rolling processing FPS
+CHUNK_WORKERS = max(1, (os.cpu_count() or 2) // 2)  # Processes for chunked=True jobs
+CHUNK_MIN_SECONDS = 120         # Shortest segment worth its own process
+CHUNK_OVERLAP_SECONDS = 3       # Warm-up before / vote run-out after each segment
+RENDER_SAMPLE_EVERY = 25        # render="sampled": write every Nth frame
+RENDER_EVENT_PRE_FRAMES = 25    # render="events": frames kept before each crossing...
+RENDER_EVENT_POST_FRAMES = 50   # ...and written after it
+# "ffmpeg": pipe frames into one ffmpeg process encoding H.264 while processing runs
+# "opencv": write mp4v, then re-encode with ffmpeg (fallback when ffmpeg is missing)
+VIDEO_ENCODER = "ffmpeg"
+ENCODER_PRESET = "fast"         # libx264 preset
+ENCODER_CRF = 23                # libx264 quality (lower = better, larger)
+ENCODER_FRAGMENTED = True       # Fragmented MP4, playable while still being written (else faststart)
+EVENT_LOG_FLUSH_EVENTS = 64     # Crossing-event log (LOG_DIR) appends every N events...
+EVENT_LOG_FLUSH_SECONDS = 5.0   # ...or after this many seconds with events waiting
+
+# Live Source Config
+MAX_LIVE_STREAMS = 4
+LIVE_RECONNECT_DELAY = 1.0      # Seconds before the first reconnect attempt (doubles up to the max)
+LIVE_MAX_RECONNECT_DELAY = 30.0
+LIVE_SAMPLE_SECONDS = 5         # Timeline sample interval
+LIVE_TIMELINE_POINTS = 720      # Rolling timeline length (1 hour at 5 s)
+LIVE_BATCH_WAIT_S = 0.02        # Multi-source jobs: how long a step waits for each source's next frame
+
 # Tracking & Detection Config
 MODEL_PATH = "yolov8s.pt"
+# Detector runtime: "torch" runs MODEL_PATH as is; "onnx" / "openvino" export it
+# once (next to the weights) and run the export, much faster on CPU-only nodes
+DETECTOR_BACKEND = "torch"
+DETECTOR_INT8 = False               # INT8 post-training quantization of the export
+DETECTOR_CALIBRATION_VIDEO = None   # Gate footage to calibrate INT8 on (required with DETECTOR_INT8)
+DETECTOR_CALIBRATION_FRAMES = 300   # Frames sampled evenly from it
+DETECTOR_INTRA_OP_THREADS = 0       # Threads within one operator (0 = runtime default)
+DETECTOR_INTER_OP_THREADS = 0       # Parallel operators (OpenVINO: streams; 0 = runtime default)
 CONF_THRESH = 0.35
 IOU_THRESH = 0.65
 TARGET_CLASSES = [0]
 TRACKER_CONFIG = "custom_bytetrack.yaml"
 GATE_LINE = [(89, 511), (546, 448)]
+# Run the detector every N frames and move tracks with a constant-velocity
+# model in between (1 = detect every frame)...
+DETECT_STRIDE = 1
+DETECT_GATE_BAND_PX = 60        # ...but always detect while a track is predicted this close to GATE_LINE (0 = off)
+DETECT_MAX_SHIFT_PX = 24        # ...or has drifted this far since its last detection (0 = off)
+DETECT_DENSE_TRACKS = 25        # ...or this many tracks are visible (0 = off)
+# Detect only inside the gate line's bounding box grown by this many pixels
+# (0 = whole frame); boxes are mapped back to frame coordinates
+DETECT_ROI_PAD_PX = 0
 
 # --- GENDER MODEL CONFIG ---
 GENDER_MODEL_PATH = "convnext_tiny_gender_82.44acc.onnx"
 GENDER_REQUIRED_VOTES = 5
 GENDER_CONF_THRESH = 0.65
+GENDER_MAX_BATCH = 32           # Max crops per batched ONNX call
+GENDER_INT8 = False             # Load the INT8 variant <name>.int8.onnx (built by benchmarks/gender_quant.py)
+GENDER_IO_BINDING = True        # Run through preallocated, IO-bound input/output buffers
+# Gender ONNX Runtime session: graph optimizations (disable | basic | extended | all)
+# and thread pool. Spinning idle threads and one thread per core (the defaults
+# of ONNX Runtime) contend with the detector's own pool on multi-job servers.
+GENDER_OPT_LEVEL = "all"
+GENDER_INTRA_OP_THREADS = 0     # 0 = one per core
+GENDER_INTER_OP_THREADS = 1
+GENDER_THREAD_SPINNING = False
+GENDER_CPU_CORES = []           # Pin the pool to these cores, e.g. [6, 7] (empty = not pinned; one core = single-threaded, not pinned)
+# "gate": only classify tracks pending an entry or about to reach GATE_LINE
+# "all":  label every visible track (demo mode, much more inference)
+GENDER_SCHEDULE = "gate"
+GENDER_GATE_BAND_PX = 80        # Always classify tracks this close to the gate line
+GENDER_LOOKAHEAD_FRAMES = 30    # ...or predicted to reach it within this many frames
+GENDER_VOTE_STRIDE = 4          # Min frames between votes on the same track
+GENDER_MIN_CROP_QUALITY = 0.25  # Wait (up to one stride) for a crop scoring at least this
+GENDER_MIN_VOTES = 2            # Earliest vote count at which a decision may lock in
+GENDER_EARLY_STOP_MARGIN = 0.5  # ...if |P(male) - P(female)| of the average reaches this
 STALE_TRACK_TIMEOUT = 100
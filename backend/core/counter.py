@@ -1,13 +1,215 @@
-from ultralytics import solutions
+from ultralytics import YOLO, solutions
+from ultralytics.solutions.solutions import SolutionResults
+import math
+import time
+from collections import deque
+from contextlib import nullcontext
 import cv2
+import numpy as np
+import torch
 import config
-from core.gender import GenderClassifier
+from core.crossing import GateCrossingDetector, gate_in_normal, gate_roi
+from core.detector import load_detector
+from core.gender import GenderClassifier, gender_model_path
+from core.quality import box_occlusion
+from core.tracks import StaleTrackHeap, make_tracker, track_boxes
+from utils.profiling import NULL_PROFILER
+
+
+_NO_MOTION = (np.nan,) * 5
+
+
+class ReplayObjectCounter(solutions.ObjectCounter):
+    """
+    ObjectCounter that can consume pre-recorded tracks instead of running
+    the detector, e.g. the boxes tracked during gate calibration.
+
+    It can also skip the detector on chosen frames: with `skip_detection`
+    set, the last detected tracks are moved forward by their per-track
+    box velocity (constant-velocity model) to `frame_idx`, so counting
+    still sees a continuous centroid path between detector calls.
+
+    Crossings are counted by a GateCrossingDetector on box centroids rather
+    than ObjectCounter's per-track check, so every IN/OUT is reported as an
+    explicit per-track event in `crossing_events` for the current frame.
+
+    With `roi` set to (x0, y0, x1, y1) the detector only sees that crop of
+    the frame; boxes are moved back to frame coordinates before tracking,
+    so tracks, crops and annotation are unaffected.
+
+    With `draw` off (nothing is rendered) the annotator is skipped and
+    `plot_im` is the input frame itself.
+    """
+
+    def __init__(self, **kwargs):
+        model = kwargs.get("model")
+        super().__init__(**kwargs)
+        if isinstance(model, YOLO):
+            # BaseSolution wraps the model in a plain YOLO sharing its state; keep the
+            # instance itself so predict/track go through its own predictor (DetectorPredictor)
+            self.model = model
+        self.replay_queue = deque()  # ultralytics Boxes (or None) per upcoming frame
+        self.skip_detection = False  # set per frame by the caller
+        self.frame_idx = 0           # set per frame by the caller
+        self.roi = None              # set per frame by the caller
+        self.draw = True             # set by the owner; False skips all annotation
+        self.roi_tracker = None
+        self.detector_calls = 0
+        self.propagated_frames = 0
+
+        # Last detected state: tid -> (box, velocity per frame, cls, conf), both (4,) arrays
+        self.detected_tracks = {}
+        self.last_detection_frame = None
+
+        self.crossings = GateCrossingDetector(self.region, stale_timeout=config.STALE_TRACK_TIMEOUT)
+        self.crossing_events = []    # [(track_id, "IN" | "OUT")] for the current frame
+
+        # Last frame each track had a box, to forget tracks the base class never sees retired
+        self._last_seen = {}
+        self._seen_expiry = StaleTrackHeap(config.STALE_TRACK_TIMEOUT)
+
+    def process(self, im0):
+        if self.draw:
+            return super().process(im0)
+        if not self.region_initialized:
+            self.initialize_region()
+            self.region_initialized = True
+        # Crossings are counted in extract_tracks; the per-box loop of
+        # ObjectCounter.process only draws and feeds the unused count_objects
+        self.extract_tracks(im0)
+        return SolutionResults(
+            plot_im=im0,
+            in_count=self.in_count,
+            out_count=self.out_count,
+            classwise_count=dict(self.classwise_count),
+            total_tracks=len(self.track_ids),
+        )
+
+    def extract_tracks(self, im0):
+        if self.skip_detection and not self.replay_queue and self.last_detection_frame is not None:
+            self._propagate_tracks()
+            self._forget_stale_tracks()
+            self._count_crossings()
+            return
+
+        # Newer ultralytics reports per-frame track time from profilers[0]
+        timer = self.profilers[0] if hasattr(self, "profilers") else nullcontext()
+        if self.replay_queue:
+            with timer:
+                self._set_tracks(self.replay_queue.popleft())
+        elif self.roi is not None:
+            with timer:
+                self._set_tracks(self._track_roi(im0))
+            self.detector_calls += 1
+        else:
+            super().extract_tracks(im0)
+            self.detector_calls += 1
+        # The base class only forgets ids retired by the model's own tracker, which
+        # replayed, ROI-tracked and propagated frames never go through
+        self._forget_stale_tracks()
+        self._record_detection()
+        self._count_crossings()
+
+    def _set_tracks(self, track_data):
+        self.track_data = track_data
+        if track_data is not None and track_data.is_track:
+            self.boxes = track_data.xyxy.cpu()
+            self.clss = track_data.cls.cpu().tolist()
+            self.track_ids = track_data.id.int().cpu().tolist()
+            self.confs = track_data.conf.cpu().tolist()
+        else:
+            self.boxes, self.clss, self.track_ids, self.confs = [], [], [], []
+
+    def _forget_stale_tracks(self):
+        """Drop track_history (and ObjectCounter's counted ids) of tracks unseen for STALE_TRACK_TIMEOUT frames."""
+        for tid in self.track_ids:
+            self._last_seen[tid] = self.frame_idx
+            self._seen_expiry.add(tid, self.frame_idx)
+        stale = self._seen_expiry.expire(self.frame_idx, self._last_seen.get)
+        for tid in stale:
+            del self._last_seen[tid]
+        self.forget_tracks(stale)
+
+    def _track_roi(self, im0):
+        if self.roi_tracker is None:
+            # Carry on from tracks made with this model before (gate calibration)
+            trackers = getattr(self.model.predictor, "trackers", None)
+            self.roi_tracker = trackers[0] if trackers else make_tracker()
+        x0, y0, x1, y1 = self.roi
+        predict_args = {k: v for k, v in self.track_add_args.items() if k != "tracker"}
+        result = self.model.predict(im0[y0:y1, x0:x1], classes=self.classes, verbose=False, **predict_args)[0]
+        return track_boxes(self.roi_tracker, result.boxes, im0, offset=(x0, y0))
+
+    def count_objects(self, current_centroid, track_id, prev_position, cls):
+        """Unused: crossings are counted for all tracks at once in `_count_crossings`."""
+
+    def _count_crossings(self):
+        boxes = self.boxes.numpy() if hasattr(self.boxes, "numpy") else np.asarray(self.boxes, dtype=np.float32)
+        boxes = boxes.reshape(-1, 4)
+        self.crossings.gate_line = self.region
+        self.crossing_events = self.crossings.update(
+            self.track_ids, (boxes[:, :2] + boxes[:, 2:]) / 2, self.frame_idx,
+        )
+        if self.crossing_events:
+            cls_of = dict(zip(self.track_ids, self.clss))
+            for tid, direction in self.crossing_events:
+                self.classwise_count[self.names[cls_of[tid]]][direction] += 1
+        self.in_count = self.crossings.in_count
+        self.out_count = self.crossings.out_count
+
+    def predicted_boxes(self, frame_idx):
+        """Motion-model boxes of the last detected tracks at `frame_idx`: {tid: (4,) array}."""
+        if self.last_detection_frame is None:
+            return {}
+        gap = frame_idx - self.last_detection_frame
+        return {tid: box + vel * gap for tid, (box, vel, _, _) in self.detected_tracks.items()}
+
+    def _record_detection(self):
+        boxes = self.boxes.numpy() if hasattr(self.boxes, "numpy") else np.asarray(self.boxes, dtype=np.float32)
+        gap = self.frame_idx - self.last_detection_frame if self.last_detection_frame is not None else 0
+
+        detected = {}
+        for box, tid, cls, conf in zip(boxes, self.track_ids, self.clss, self.confs):
+            box = box.astype(np.float32)
+            prev = self.detected_tracks.get(tid)
+            if prev is None or gap <= 0:
+                vel = np.zeros(4, dtype=np.float32)
+            else:
+                # Smoothed so one jittery box does not throw the track off between detections
+                vel = 0.5 * prev[1] + 0.5 * (box - prev[0]) / gap
+            detected[tid] = (box, vel, cls, conf)
+
+        self.detected_tracks = detected
+        self.last_detection_frame = self.frame_idx
+
+    def _propagate_tracks(self):
+        timer = self.profilers[0] if hasattr(self, "profilers") else nullcontext()
+        with timer:
+            predicted = self.predicted_boxes(self.frame_idx)
+        self.propagated_frames += 1
+        self.track_data = None
+        if not predicted:
+            self.boxes, self.clss, self.track_ids, self.confs = [], [], [], []
+            return
+        self.track_ids = list(predicted)
+        self.boxes = torch.from_numpy(np.stack([predicted[tid] for tid in self.track_ids]))
+        self.clss = [self.detected_tracks[tid][2] for tid in self.track_ids]
+        self.confs = [self.detected_tracks[tid][3] for tid in self.track_ids]
 
 
 class TempleCounter:
-    def __init__(self):
-        self.counter = solutions.ObjectCounter(
-            model=config.MODEL_PATH,
+    def __init__(self, detector=None, gender_session=None, profiler=None, draw=True):
+        """
+        `detector` / `gender_session` come from core.registry so jobs share
+        already-loaded weights; without them both models are loaded here.
+        `profiler` (utils.profiling.StageProfiler) receives per-stage timings.
+        `draw=False` is for jobs that render nothing: boxes, region and counts
+        are not drawn and `analyze_frame` returns the frame untouched.
+        """
+        self.profiler = profiler or NULL_PROFILER
+        self.gate_line = config.GATE_LINE
+        self.counter = ReplayObjectCounter(
+            model=detector if detector is not None else load_detector(),
             region=config.GATE_LINE,
             classes=config.TARGET_CLASSES,
             conf=config.CONF_THRESH,
@@ -16,16 +218,22 @@ class TempleCounter:
             show=False,
             verbose=False,
         )
-
-        if config.DEVICE == "cuda":
-            self.counter.model.to(config.DEVICE)
+        self.counter.draw = draw
 
         self.gender_classifier = GenderClassifier(
-            model_path=config.GENDER_MODEL_PATH,
+            model_path=gender_model_path(),
             required_votes=config.GENDER_REQUIRED_VOTES,
             stale_timeout=config.STALE_TRACK_TIMEOUT,
             confidence_thresh=config.GENDER_CONF_THRESH,
             device=config.DEVICE,
+            max_batch_size=config.GENDER_MAX_BATCH,
+            vote_stride=config.GENDER_VOTE_STRIDE,
+            min_quality=config.GENDER_MIN_CROP_QUALITY,
+            min_votes=config.GENDER_MIN_VOTES,
+            early_stop_margin=config.GENDER_EARLY_STOP_MARGIN,
+            session=gender_session,
+            profiler=self.profiler,
+            io_binding=config.GENDER_IO_BINDING,
         )
 
         # Demographic accumulators
@@ -34,13 +242,62 @@ class TempleCounter:
         self.unknown_count = 0
 
         # State for entry-anchored demographic counting
-        self._prev_in_count = 0
         self._pending_gender = set()    # entered but gender not yet resolved
         self._counted_genders = set()   # already tallied
+        self._entries = {}              # tid -> (frame, wall time, x, y) its entry was counted at
+        self.entry_log = []             # tallied entries: (entry frame, tid, gender)
+
+        # Finished crossings not yet taken by `pop_crossings`:
+        # (frame, wall time, tid, "IN" | "OUT", gender, confidence, x, y), where
+        # wall time is when the crossing frame was analyzed (IN records are
+        # only finished once the gender is tallied, possibly much later)
+        self.crossing_log = []
+
+        # Per-track motion for gender scheduling: tid -> (cx, cy, vx, vy, last_frame)
+        self._track_motion = {}
+        self._motion_expiry = StaleTrackHeap(config.STALE_TRACK_TIMEOUT)
+
+    def set_gate_line(self, gate_line):
+        """Move this counter's line (e.g. after calibration) before processing starts."""
+        self.gate_line = gate_line
+        self.counter.region = gate_line
+        self.counter.region_initialized = False
+
+    def detection_roi(self, frame_shape):
+        """Region the detector sees for this gate line and frame size (None = whole frame)."""
+        return gate_roi(self.gate_line, frame_shape, config.DETECT_ROI_PAD_PX)
+
+    def replay_tracks(self, track_cache):
+        """
+        Queue tracks recorded by auto_calibrate_gate(model=self.counter.model)
+        for the first len(track_cache) frames, so they are not detected twice.
+        """
+        self.counter.replay_queue.extend(track_cache)
 
     def process_frame(self, frame, frame_idx):
-        res = self.counter(frame)
-        annotated_frame = res.plot_im.copy()
+        plot_im, labels, in_count, out_count = self.analyze_frame(frame, frame_idx)
+        with self.profiler.stage("annotate"):
+            annotated_frame = plot_im.copy()
+            self.annotate(annotated_frame, labels)
+        return annotated_frame, in_count, out_count
+
+    def analyze_frame(self, frame, frame_idx):
+        """
+        Detection, tracking, counting and gender inference for one frame.
+
+        Returns (plot_im, labels, in_count, out_count) where `labels` holds the
+        gender overlays still to be drawn by `annotate`, so rendering can run
+        on a different thread than inference.
+        """
+        detect = self.should_detect(frame_idx)
+        self.counter.frame_idx = frame_idx
+        self.counter.roi = self.detection_roi(frame.shape)
+        self.counter.skip_detection = not detect
+        with self.profiler.stage("detect_track"):
+            # The annotator draws into the image it is given; gender crops
+            # must come from the clean frame whatever the render mode
+            res = self.counter(frame.copy() if self.counter.draw else frame)
+        labels = []
 
         boxes = self.counter.boxes
         ids = self.counter.track_ids
@@ -51,79 +308,230 @@ class TempleCounter:
             if hasattr(boxes, "cpu"):
                 boxes = boxes.cpu().numpy()
 
-            # Build per-track info for this frame
-            track_info = []
-            for box, tid in zip(boxes, ids):
-                tid = int(tid)
-                current_ids.add(tid)
-                x1, y1, x2, y2 = map(int, box)
-                cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-                track_info.append((tid, cx, cy, x1, y1, x2, y2))
+            # Per-track arrays for this frame (integer pixel boxes, as drawn)
+            id_list = [int(tid) for tid in ids]
+            xyxy = np.asarray(boxes)[:, :4].astype(np.int32)
+            centroids = (xyxy[:, :2] + xyxy[:, 2:]) / 2.0
+            current_ids.update(id_list)
 
             # -----------------------------------------------------------
-            # When in_count increases, mark the N closest-to-line tracks
-            # that haven't been counted yet as "entered".
-            # This uses ObjectCounter as the sole authority on who entered.
+            # Every track that crossed inwards this frame is an entry whose
+            # gender is still to be tallied; exits are logged straight away.
             # -----------------------------------------------------------
-            new_entries = self.counter.in_count - self._prev_in_count
-            if new_entries > 0:
-                p1, p2 = config.GATE_LINE
-                lmx, lmy = (p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2
-
-                candidates = []
-                for tid, cx, cy, *_ in track_info:
-                    if tid not in self._counted_genders and tid not in self._pending_gender:
-                        dist = (cx - lmx) ** 2 + (cy - lmy) ** 2
-                        candidates.append((dist, tid))
-
-                candidates.sort()  # closest first
-                for i in range(min(new_entries, len(candidates))):
-                    self._pending_gender.add(candidates[i][1])
-
-            self._prev_in_count = self.counter.in_count
+            row = {tid: i for i, tid in enumerate(id_list)}
+            now = time.time()
+            for tid, direction in self.counter.crossing_events:
+                x, y = centroids[row[tid]].tolist()
+                if direction == "IN":
+                    # A track can enter again once its earlier crossing has expired
+                    self._counted_genders.discard(tid)
+                    self._pending_gender.add(tid)
+                    self._entries[tid] = (frame_idx, now, x, y)
+                else:
+                    classifier = self.gender_classifier
+                    self.crossing_log.append((
+                        frame_idx, now, tid, "OUT", classifier.track_cache.get(tid),
+                        classifier.track_confidence.get(tid), x, y,
+                    ))
 
             # -----------------------------------------------------------
-            # Gender inference + tally (for ALL visible tracks)
+            # Gender inference + tally (for tracks that can still affect it)
+            # One batched ONNX call covers every track still collecting votes.
             # -----------------------------------------------------------
-            for tid, cx, cy, x1, y1, x2, y2 in track_info:
+            with self.profiler.stage("crop_preprocess"):
                 h, w = frame.shape[:2]
-                crop = frame[max(0, y1):min(h, y2), max(0, x1):min(w, x2)]
+                occlusion = box_occlusion(boxes)
+                wanted = self._gender_mask(id_list, centroids, frame_idx, detected=detect)
+                clipped = np.clip(xyxy, 0, [w, h, w, h])
+                crops = {}
+                crop_occlusion = {}
+                for i in np.flatnonzero(wanted):
+                    x1, y1, x2, y2 = clipped[i]
+                    crop = frame[y1:y2, x1:x2]
+                    if crop.size > 0:
+                        crops[id_list[i]] = crop
+                        crop_occlusion[id_list[i]] = float(occlusion[i])
 
-                gender = None
-                if crop.size > 0:
-                    gender = self.gender_classifier.get_gender(tid, crop, frame_idx)
+            # Pending entries vote every frame so they resolve before leaving
+            genders = self.gender_classifier.get_genders(
+                crops, frame_idx, occlusion=crop_occlusion, urgent=self._pending_gender,
+            )
+
+            for tid, gender in genders.items():
+                if not gender:
+                    continue
 
                 # Tally only if this track entered AND has a resolved gender
-                if gender and tid in self._pending_gender and tid not in self._counted_genders:
-                    self._counted_genders.add(tid)
+                if tid in self._pending_gender and tid not in self._counted_genders:
                     self._pending_gender.discard(tid)
-                    if gender == "Male":
-                        self.male_count += 1
-                    elif gender == "Female":
-                        self.female_count += 1
-                    else:
-                        self.unknown_count += 1
+                    self._tally_entry(tid, gender, frame_idx)
 
                 # Draw gender label on bounding box regardless
-                if gender:
-                    color = (
-                        (255, 200, 0) if gender == "Male"
-                        else (0, 255, 255) if gender == "Female"
-                        else (200, 200, 200)
-                    )
-                    cv2.putText(
-                        annotated_frame, gender,
-                        (x1, y1 - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2, cv2.LINE_AA,
-                    )
+                x1, y1 = xyxy[row[tid], :2]
+                labels.append((gender, int(x1), int(y1)))
 
         # Evict lost tracks — force-tally pending ones as Unknown
         for t in list(self._pending_gender):
             if t not in current_ids:
                 self._pending_gender.discard(t)
                 if t not in self._counted_genders:
-                    self._counted_genders.add(t)
-                    self.unknown_count += 1
+                    self._tally_entry(t, "Unknown", frame_idx)
+
+        for tid in self._motion_expiry.expire(frame_idx, self._motion_last_seen):
+            del self._track_motion[tid]
 
         self.gender_classifier.clean_stale_tracks(frame_idx)
-        return annotated_frame, self.counter.in_count, self.counter.out_count
+        return res.plot_im, labels, self.counter.in_count, self.counter.out_count
+
+    def _tally_entry(self, tid, gender, frame_idx):
+        self._counted_genders.add(tid)
+        entry_frame, entry_time, x, y = self._entries.pop(tid, (frame_idx, time.time(), np.nan, np.nan))
+        self.entry_log.append((entry_frame, tid, gender))
+        self.crossing_log.append((
+            entry_frame, entry_time, tid, "IN", gender, self.gender_classifier.track_confidence.get(tid), x, y,
+        ))
+        if gender == "Male":
+            self.male_count += 1
+        elif gender == "Female":
+            self.female_count += 1
+        else:
+            self.unknown_count += 1
+
+    def flush_pending_entries(self):
+        """
+        Tally entries still waiting for a gender as Unknown, for when the
+        video ends or a live job stops, so every IN reaches the tallies
+        and `crossing_log`.
+        """
+        for tid in list(self._pending_gender):
+            self._pending_gender.discard(tid)
+            self._tally_entry(tid, "Unknown", self.counter.frame_idx)
+
+    def pop_crossings(self):
+        """Take the crossings finished since the last call (see `crossing_log`)."""
+        crossings, self.crossing_log = self.crossing_log, []
+        return crossings
+
+    @staticmethod
+    def annotate(image, labels):
+        """Draw gender labels from `analyze_frame` onto `image` in place."""
+        for gender, x1, y1 in labels:
+            color = (
+                (255, 200, 0) if gender == "Male"
+                else (0, 255, 255) if gender == "Female"
+                else (200, 200, 200)
+            )
+            cv2.putText(
+                image, gender,
+                (x1, y1 - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2, cv2.LINE_AA,
+            )
+        return image
+
+    def should_detect(self, frame_idx):
+        """
+        Decide whether this frame runs the detector or reuses propagated tracks.
+
+        With DETECT_STRIDE > 1 the detector runs at least every DETECT_STRIDE
+        frames, and also on any frame where the motion model is least
+        trustworthy: a track is predicted within DETECT_GATE_BAND_PX of
+        the gate line (so crossings are always decided on detected boxes), a
+        track would have drifted more than DETECT_MAX_SHIFT_PX since its
+        last detection, or the scene holds DETECT_DENSE_TRACKS or more tracks.
+        """
+        last = self.counter.last_detection_frame
+        if config.DETECT_STRIDE <= 1 or last is None or self.counter.replay_queue:
+            return True
+        gap = frame_idx - last
+        if gap >= config.DETECT_STRIDE or gap <= 0:
+            return True
+
+        tracks = self.counter.detected_tracks
+        if not tracks:
+            return False
+        if config.DETECT_DENSE_TRACKS and len(tracks) >= config.DETECT_DENSE_TRACKS:
+            return True
+
+        boxes = np.stack([box for box, _, _, _ in tracks.values()])
+        vels = np.stack([vel for _, vel, _, _ in tracks.values()])
+        shift = (vels[:, :2] + vels[:, 2:]) / 2 * gap     # centroid displacement
+        if config.DETECT_MAX_SHIFT_PX and np.hypot(shift[:, 0], shift[:, 1]).max() > config.DETECT_MAX_SHIFT_PX:
+            return True
+
+        if config.DETECT_GATE_BAND_PX:
+            centroids = (boxes[:, :2] + boxes[:, 2:]) / 2 + shift
+            (x1, y1), (x2, y2) = self.gate_line
+            seg = np.array([x2 - x1, y2 - y1], dtype=np.float32)
+            rel = centroids - np.array([x1, y1], dtype=np.float32)
+            t = np.clip(rel @ seg / max(float(seg @ seg), 1e-6), 0.0, 1.0)
+            dist = np.hypot(*(rel - t[:, None] * seg).T)
+            if dist.min() <= config.DETECT_GATE_BAND_PX:
+                return True
+
+        return False
+
+    def _gender_mask(self, id_list, centroids, frame_idx, detected=True):
+        """
+        Which visible tracks should get a gender vote this frame, as a bool array.
+
+        In "gate" mode only tracks that can still change the tally are
+        classified: pending entries, and tracks not yet counted at the
+        gate that are near the gate line or heading towards it fast
+        enough to cross within GENDER_LOOKAHEAD_FRAMES. Cached tracks are
+        always passed through (no inference) so their labels stay drawn.
+        On frames without a detection (see `should_detect`) only pending
+        and cached tracks are passed, since propagated boxes are approximate.
+        """
+        n = len(id_list)
+        vel = self._update_motion(id_list, centroids, frame_idx)
+
+        cache = self.gender_classifier.track_cache
+        forced = np.fromiter(
+            (tid in self._pending_gender or tid in cache for tid in id_list), dtype=bool, count=n,
+        )
+        if not detected:
+            return forced
+        if config.GENDER_SCHEDULE == "all":
+            return np.ones(n, dtype=bool)
+
+        counted = self.counter.crossings.counted_ids
+        done = np.fromiter(
+            (tid in self._counted_genders or tid in counted for tid in id_list), dtype=bool, count=n,
+        )
+
+        (x1, y1), (x2, y2) = self.gate_line
+        normal = gate_in_normal(self.gate_line)
+        if normal is None:
+            return np.ones(n, dtype=bool)
+        length = math.hypot(x2 - x1, y2 - y1)
+        unit = np.array([(x2 - x1) / length, (y2 - y1) / length])
+
+        rel = centroids - np.array([x1, y1])
+        along = rel @ unit
+        dist = rel @ normal             # < 0 before crossing inwards
+        band = config.GENDER_GATE_BAND_PX
+        in_span = (along >= -band) & (along <= length + band)
+
+        closing_speed = vel @ normal
+        approaching = (dist < 0) & (closing_speed > 0) & (-dist <= closing_speed * config.GENDER_LOOKAHEAD_FRAMES)
+        return forced | (~done & in_span & ((np.abs(dist) <= band) | approaching))
+
+    def _update_motion(self, id_list, centroids, frame_idx):
+        """Update and return smoothed per-frame velocities (N, 2) for the visible tracks."""
+        prev = np.array(
+            [self._track_motion.get(tid, _NO_MOTION) for tid in id_list], dtype=np.float64,
+        ).reshape(len(id_list), 5)
+        known = ~np.isnan(prev[:, 0])
+        gap = np.maximum(1.0, frame_idx - prev[known, 4])[:, None]
+
+        vel = np.zeros((len(id_list), 2))
+        vel[known] = 0.5 * prev[known, 2:4] + 0.5 * (centroids[known] - prev[known, :2]) / gap
+
+        for tid, (cx, cy), (vx, vy) in zip(id_list, centroids.tolist(), vel.tolist()):
+            self._track_motion[tid] = (cx, cy, vx, vy, frame_idx)
+            self._motion_expiry.add(tid, frame_idx)
+        return vel
+
+    def _motion_last_seen(self, tid):
+        motion = self._track_motion.get(tid)
+        return motion[4] if motion is not None else None
@@ -0,0 +1,118 @@
+import numpy as np
+
+from core.tracks import StaleTrackHeap
+
+
+def gate_in_normal(gate_line):
+    """
+    Unit normal of `gate_line` pointing in the IN direction: right for a
+    mostly vertical line, down for a mostly horizontal one (the convention
+    ultralytics' ObjectCounter uses). None for a zero-length line.
+    """
+    (x1, y1), (x2, y2) = gate_line
+    lx, ly = x2 - x1, y2 - y1
+    length = float(np.hypot(lx, ly))
+    if length == 0:
+        return None
+    normal = np.array([-ly / length, lx / length])
+    if (normal[0] if abs(lx) < abs(ly) else normal[1]) < 0:
+        normal = -normal
+    return normal
+
+
+def gate_roi(gate_line, frame_shape, pad):
+    """
+    Detection region around `gate_line`: its bounding box grown by `pad`
+    pixels and clipped to the frame, as (x0, y0, x1, y1). None when `pad`
+    is off (<= 0) or the region would cover the whole frame anyway.
+    """
+    if pad <= 0:
+        return None
+    h, w = frame_shape[:2]
+    (ax, ay), (bx, by) = gate_line
+    x0, y0 = max(0, int(min(ax, bx) - pad)), max(0, int(min(ay, by) - pad))
+    x1, y1 = min(w, int(max(ax, bx) + pad)), min(h, int(max(ay, by) + pad))
+    if x1 <= x0 or y1 <= y0 or (x1 - x0) * (y1 - y0) >= w * h:
+        return None
+    return x0, y0, x1, y1
+
+
+class GateCrossingDetector:
+    """
+    Per-track IN/OUT events from motion segments crossing the gate line.
+
+    Keeps each track's previous anchor point and, every frame, tests all
+    (previous -> current) segments against the gate segment at once. A track
+    is counted at most once, in the direction it crossed, so demographic
+    counting can key directly off the crossing track id. Tracks unseen for
+    `stale_timeout` frames are forgotten.
+    """
+
+    def __init__(self, gate_line, stale_timeout=100):
+        self.gate_line = gate_line
+        self.in_count = 0
+        self.out_count = 0
+        self.counted_ids = set()
+        self._prev = {}             # tid -> (x, y, last_frame)
+        self._expiry = StaleTrackHeap(stale_timeout)
+
+    def update(self, track_ids, points, frame_idx):
+        """
+        Feed the anchor points (N, 2) of the visible tracks for `frame_idx`.
+
+        Returns this frame's events as [(track_id, "IN" | "OUT")].
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        events = []
+        if len(track_ids):
+            prev = np.array(
+                [self._prev.get(tid, (np.nan, np.nan, 0))[:2] for tid in track_ids], dtype=np.float64,
+            )
+            known = ~np.isnan(prev[:, 0])
+            counted = np.fromiter((tid in self.counted_ids for tid in track_ids), dtype=bool, count=len(track_ids))
+            candidates = np.flatnonzero(known & ~counted)
+
+            if candidates.size:
+                crossed, inward = self._intersect(prev[candidates], points[candidates])
+                for i, is_in in zip(candidates[crossed].tolist(), inward[crossed].tolist()):
+                    tid = track_ids[i]
+                    self.counted_ids.add(tid)
+                    if is_in:
+                        self.in_count += 1
+                    else:
+                        self.out_count += 1
+                    events.append((tid, "IN" if is_in else "OUT"))
+
+            for tid, (x, y) in zip(track_ids, points.tolist()):
+                self._prev[tid] = (x, y, frame_idx)
+                self._expiry.add(tid, frame_idx)
+
+        for tid in self._expiry.expire(frame_idx, self._last_seen):
+            del self._prev[tid]
+            self.counted_ids.discard(tid)
+        return events
+
+    def _intersect(self, p, q):
+        """Which segments p[i] -> q[i] cross the gate, and whether inwards."""
+        a = np.asarray(self.gate_line[0], dtype=np.float64)
+        b = np.asarray(self.gate_line[1], dtype=np.float64)
+        ab = b - a
+        motion = q - p
+
+        # Side of the gate line before and after, and side of the motion line for each gate end
+        side_p = ab[0] * (p[:, 1] - a[1]) - ab[1] * (p[:, 0] - a[0])
+        side_q = ab[0] * (q[:, 1] - a[1]) - ab[1] * (q[:, 0] - a[0])
+        side_a = motion[:, 0] * (a[1] - p[:, 1]) - motion[:, 1] * (a[0] - p[:, 0])
+        side_b = motion[:, 0] * (b[1] - p[:, 1]) - motion[:, 1] * (b[0] - p[:, 0])
+
+        # Strictly leaves one side (landing exactly on the line counts) within the gate's extent
+        crossed = (side_p != 0) & (side_p * side_q <= 0) & (side_a * side_b <= 0)
+
+        normal = gate_in_normal(self.gate_line)
+        if normal is None:
+            return np.zeros(len(p), dtype=bool), np.zeros(len(p), dtype=bool)
+        return crossed, motion @ normal > 0
+
+    def _last_seen(self, tid):
+        prev = self._prev.get(tid)
+        return prev[2] if prev is not None else None
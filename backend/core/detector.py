@@ -0,0 +1,254 @@
+import os
+import shutil
+import threading
+from functools import partial
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+import torch
+from ultralytics import YOLO
+from ultralytics.data.augment import LetterBox
+from ultralytics.models.yolo.detect import DetectionPredictor
+from ultralytics.nn.autobackend import AutoBackend
+from ultralytics.utils.torch_utils import select_device
+
+import config
+
+BACKENDS = ("torch", "onnx", "openvino")
+CALIBRATION_IMGSZ = 640
+
+_onnx_backends = {}
+_onnx_lock = threading.Lock()
+
+
+def detector_path(backend=None, int8=None):
+    """Where the detector for `backend` lives: MODEL_PATH itself for torch, else its export next to it."""
+    backend = backend or config.DETECTOR_BACKEND
+    int8 = config.DETECTOR_INT8 if int8 is None else int8
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS}")
+    weights = Path(config.MODEL_PATH)
+    if backend == "torch":
+        return str(weights)
+    if backend == "onnx":
+        return str(weights.with_suffix(".int8.onnx" if int8 else ".onnx"))
+    return str(weights.parent / f"{weights.stem}_{'int8_' if int8 else ''}openvino_model")
+
+
+def export_detector(backend=None, int8=None, calibration_video=None):
+    """
+    Path of the detector for `backend`, exporting MODEL_PATH first if needed.
+
+    Exports are dynamic-shape (batched multi-source steps and gate ROI
+    crops keep working) and cached next to the weights; delete them to
+    re-export. INT8 variants are post-training quantized with calibration
+    frames from `calibration_video` (DETECTOR_CALIBRATION_VIDEO), i.e. our
+    own gate footage rather than a generic dataset. The detection head is
+    left in float, where quantization costs the most accuracy.
+    """
+    backend = backend or config.DETECTOR_BACKEND
+    int8 = config.DETECTOR_INT8 if int8 is None else int8
+    if int8 and backend == "torch":
+        raise ValueError("DETECTOR_INT8 needs the onnx or openvino backend")
+    path = detector_path(backend, int8)
+    if backend == "torch" or os.path.exists(path):
+        return path
+
+    fp32_path = detector_path(backend, int8=False)
+    model = YOLO(config.MODEL_PATH)
+    head = len(model.model.model) - 1
+    if not os.path.exists(fp32_path):
+        exported = model.export(format=backend, dynamic=True, imgsz=CALIBRATION_IMGSZ, verbose=False)
+        if os.path.abspath(exported) != os.path.abspath(fp32_path):
+            shutil.move(exported, fp32_path)
+    if not int8:
+        return fp32_path
+
+    video = calibration_video or config.DETECTOR_CALIBRATION_VIDEO
+    if not video:
+        raise ValueError("DETECTOR_INT8 needs DETECTOR_CALIBRATION_VIDEO (gate footage to calibrate on)")
+    frames = calibration_frames(video, config.DETECTOR_CALIBRATION_FRAMES)
+    if backend == "onnx":
+        _quantize_onnx(fp32_path, path, frames, head)
+    else:
+        _quantize_openvino(fp32_path, path, frames, head)
+    print(f"Detector quantized to INT8 on {video}: {path}")
+    return path
+
+
+def calibration_frames(video_path, count, imgsz=CALIBRATION_IMGSZ):
+    """Up to `count` frames spread over the video, letterboxed to the detector's input (1, 3, H, W) float32."""
+    cap = cv2.VideoCapture(video_path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if not cap.isOpened() or total <= 0:
+        cap.release()
+        raise ValueError(f"Cannot read calibration video {video_path}")
+    letterbox = LetterBox((imgsz, imgsz), auto=False)
+    frames = []
+    try:
+        for idx in np.linspace(0, total - 1, min(count, total)).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ret, frame = cap.read()
+            if not ret:
+                continue
+            image = letterbox(image=frame)[..., ::-1].transpose(2, 0, 1)  # BGR HWC -> RGB CHW
+            frames.append(np.ascontiguousarray(image, dtype=np.float32)[None] / 255.0)
+    finally:
+        cap.release()
+    return frames
+
+
+def _quantize_onnx(fp32_path, int8_path, frames, head):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # Shape inference and graph folding first, so every activation gets calibrated ranges
+    prepared_path = f"{int8_path}.prep"
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+    fp32 = onnx.load(fp32_path)
+    input_name = fp32.graph.input[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            return None if frame is None else {input_name: frame}
+
+    quantize_static(
+        prepared_path, int8_path, FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=[node.name for node in fp32.graph.node if node.name.startswith(f"/model.{head}/")],
+    )
+    os.remove(prepared_path)
+    # Keep the export metadata (class names, stride, imgsz) ultralytics loads the model with
+    int8 = onnx.load(int8_path)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, int8_path)
+
+
+def _quantize_openvino(fp32_dir, int8_dir, frames, head):
+    import nncf
+    import openvino as ov
+
+    fp32_xml = next(Path(fp32_dir).glob("*.xml"))
+    quantized = nncf.quantize(
+        ov.Core().read_model(fp32_xml),
+        nncf.Dataset(frames),
+        preset=nncf.QuantizationPreset.MIXED,
+        ignored_scope=nncf.IgnoredScope(patterns=[rf".*model\.{head}[/.].*"], validate=False),
+    )
+    os.makedirs(int8_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(int8_dir, fp32_xml.name))
+    shutil.copy(os.path.join(fp32_dir, "metadata.yaml"), int8_dir)
+
+
+def load_detector(backend=None, int8=None):
+    """
+    The configured detector as a YOLO model.
+
+    "torch" loads MODEL_PATH (on CUDA if available) and applies the thread
+    limits to PyTorch; "onnx" / "openvino" export it if needed and run the
+    export on CPU through DetectorPredictor.
+    """
+    backend = backend or config.DETECTOR_BACKEND
+    int8 = config.DETECTOR_INT8 if int8 is None else int8
+    if backend == "torch" and not int8:
+        _set_torch_threads()
+        detector = DetectorYOLO(config.MODEL_PATH)
+        if config.DEVICE == "cuda":
+            detector.to(config.DEVICE)
+        return detector
+    return DetectorYOLO(export_detector(backend, int8), task="detect")
+
+
+def _set_torch_threads():
+    if config.DETECTOR_INTRA_OP_THREADS > 0:
+        torch.set_num_threads(config.DETECTOR_INTRA_OP_THREADS)
+    if config.DETECTOR_INTER_OP_THREADS > 0 and torch.get_num_interop_threads() != config.DETECTOR_INTER_OP_THREADS:
+        try:
+            torch.set_num_interop_threads(config.DETECTOR_INTER_OP_THREADS)
+        except RuntimeError:
+            # Only settable before PyTorch's first parallel region
+            print("Warning: DETECTOR_INTER_OP_THREADS ignored, PyTorch inter-op pool already started.")
+
+
+def _onnx_session_options():
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if config.DETECTOR_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = config.DETECTOR_INTRA_OP_THREADS
+    if config.DETECTOR_INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = config.DETECTOR_INTER_OP_THREADS
+        if config.DETECTOR_INTER_OP_THREADS > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return options
+
+
+def _onnx_backend(path, device):
+    """One AutoBackend per ONNX export, shared by every job (InferenceSession.run is thread-safe)."""
+    with _onnx_lock:
+        backend = _onnx_backends.get(path)
+        if backend is None:
+            backend = AutoBackend(model=path, device=device, verbose=False)
+            backend.eval()
+            backend.backend.session = ort.InferenceSession(
+                path, _onnx_session_options(), providers=backend.backend.session.get_providers(),
+            )
+            _onnx_backends[path] = backend
+        return backend
+
+
+def _set_openvino_threads(backend, path):
+    threads = {}
+    if config.DETECTOR_INTRA_OP_THREADS > 0:
+        threads["INFERENCE_NUM_THREADS"] = config.DETECTOR_INTRA_OP_THREADS
+    if config.DETECTOR_INTER_OP_THREADS > 0:
+        threads["NUM_STREAMS"] = config.DETECTOR_INTER_OP_THREADS
+    if not threads:
+        return
+    compile_model = backend.compile_model
+    core = compile_model.func.__self__
+    backend.compile_model = partial(
+        compile_model.func,
+        device_name=compile_model.keywords["device_name"],
+        config={**compile_model.keywords["config"], **threads},
+    )
+    backend.ov_compiled_model = backend.compile_model(core.read_model(next(Path(path).glob("*.xml"))))
+
+
+class DetectorPredictor(DetectionPredictor):
+    """
+    DetectionPredictor that runs exported detectors with the configured threads.
+
+    ONNX exports share one session per process instead of loading one per
+    job; OpenVINO exports are compiled per job (a compiled model's implicit
+    infer request is not thread-safe) and recompiled with the thread limits.
+    """
+
+    def setup_model(self, model, verbose=True):
+        if isinstance(model, (str, Path)) and str(model).endswith(".onnx"):
+            self.model = _onnx_backend(str(model), select_device(self.args.device, verbose=verbose))
+            self.device = self.model.device
+            return
+        super().setup_model(model, verbose)
+        if self.model.format == "openvino":
+            _set_openvino_threads(self.model.backend, model)
+
+
+class DetectorYOLO(YOLO):
+    """YOLO whose detect task predicts and tracks through DetectorPredictor."""
+
+    @property
+    def task_map(self):
+        task_map = super().task_map
+        task_map["detect"] = {**task_map["detect"], "predictor": DetectorPredictor}
+        return task_map
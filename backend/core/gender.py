@@ -1,41 +1,238 @@
+import os
+from pathlib import Path
+
 import numpy as np
 import cv2
 import onnxruntime as ort
+import config
+from core.quality import crop_quality
+from core.tracks import StaleTrackHeap
+from utils.profiling import NULL_PROFILER
 
-class GenderClassifier:
-    def __init__(self, model_path: str, required_votes: int = 5, stale_timeout: int = 100, confidence_thresh: float = 0.5, device: str = "cpu"):
-        providers = (
-            ["CUDAExecutionProvider", "CPUExecutionProvider"]
-            if device == "cuda"
-            else ["CPUExecutionProvider"]
+# Replicate PyTorch Resize((256, 128)) then CenterCrop((224, 112))
+RESIZE_H, RESIZE_W = 256, 128
+CROP_H, CROP_W = 224, 112
+CROP_Y0 = (RESIZE_H - CROP_H) // 2
+CROP_X0 = (RESIZE_W - CROP_W) // 2
+
+# ImageNet normalisation (RGB order)
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# (x / 255 - mean) / std is folded into x * scale + bias
+NORM_SCALE = (1.0 / (255.0 * STD)).reshape(3, 1, 1)
+NORM_BIAS = (-MEAN / STD).reshape(3, 1, 1)
+
+OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def gender_model_path(int8=None):
+    """GENDER_MODEL_PATH, or its INT8 variant (<name>.int8.onnx) with GENDER_INT8 when it exists."""
+    int8 = config.GENDER_INT8 if int8 is None else int8
+    if int8:
+        int8_path = str(Path(config.GENDER_MODEL_PATH).with_suffix(".int8.onnx"))
+        if os.path.exists(int8_path):
+            return int8_path
+        print(f"Warning: {int8_path} not found (see benchmarks/gender_quant.py). Using the FP32 gender model.")
+    return config.GENDER_MODEL_PATH
+
+
+def gender_session_options():
+    """
+    SessionOptions from the GENDER_* runtime settings.
+
+    With GENDER_CPU_CORES the intra-op pool gets one thread per listed
+    core, each pinned to its core, so gender inference stays off the cores
+    left to the detector. ORT runs one share of the work on the calling
+    (job) thread, which is not pinned. A single listed core therefore pins
+    nothing: inference runs single-threaded on the job thread, wherever it
+    is scheduled, and a warning is printed.
+    """
+    if config.GENDER_OPT_LEVEL not in OPT_LEVELS:
+        raise ValueError(f"GENDER_OPT_LEVEL must be one of {list(OPT_LEVELS)}, got {config.GENDER_OPT_LEVEL!r}")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = OPT_LEVELS[config.GENDER_OPT_LEVEL]
+    if config.GENDER_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = config.GENDER_INTRA_OP_THREADS
+    if config.GENDER_INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = config.GENDER_INTER_OP_THREADS
+    if not config.GENDER_THREAD_SPINNING:
+        # Idle pool threads sleep instead of spinning on cores YOLO needs
+        options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        options.add_session_config_entry("session.inter_op.allow_spinning", "0")
+    if config.GENDER_CPU_CORES:
+        cores = list(config.GENDER_CPU_CORES)
+        options.intra_op_num_threads = len(cores)
+        if len(cores) > 1:
+            # One entry per pool thread (the calling thread is the first share); ORT counts cores from 1
+            options.add_session_config_entry(
+                "session.intra_op_thread_affinities", ";".join(str(core + 1) for core in cores[1:]),
+            )
+        else:
+            # No pool thread to pin, and the calling thread is whichever job runs the session
+            print(f"Warning: GENDER_CPU_CORES={cores} pins nothing; list two or more cores to pin the gender pool.")
+    return options
+
+
+def create_gender_session(model_path, device="cpu"):
+    providers = (
+        ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        if device == "cuda"
+        else ["CPUExecutionProvider"]
+    )
+    return ort.InferenceSession(model_path, gender_session_options(), providers=providers)
+
+
+def preprocess_crops(crops):
+    """Model input (N, 3, CROP_H, CROP_W) for the crops that can be preprocessed, and their indices."""
+    batch = np.empty((len(crops), 3, CROP_H, CROP_W), dtype=np.float32)
+    resize_buffer = np.empty((RESIZE_H, RESIZE_W, 3), dtype=np.uint8)
+    kept = [i for i, crop in enumerate(crops) if preprocess_into(crop, batch[i], resize_buffer)]
+    return batch[kept], kept
+
+
+def preprocess_into(crop, out, resize_buffer):
+    """Write one normalised CHW crop into `out` without per-crop temporaries."""
+    h, w = crop.shape[:2]
+    if h == 0 or w == 0:
+        return False
+
+    # 85% Crop to preserve face/chin on steep CCTV angles
+    crop = crop[: int(h * 0.85), :]
+    if crop.size == 0:
+        return False
+
+    cv2.resize(crop, (RESIZE_W, RESIZE_H), dst=resize_buffer)
+
+    # Center crop, BGR->RGB and HWC->CHW are all views of the resize buffer;
+    # the uint8->float scaling and mean/std land in one multiply-add.
+    view = resize_buffer[CROP_Y0:CROP_Y0 + CROP_H, CROP_X0:CROP_X0 + CROP_W, ::-1].transpose(2, 0, 1)
+    np.multiply(view, NORM_SCALE, out=out)
+    out += NORM_BIAS
+
+    return True
+
+
+def quantize_gender_model(model_path, int8_path, calibration=None):
+    """
+    Write an INT8 copy of the gender model to `int8_path`.
+
+    With `calibration` (a preprocessed (N, 3, CROP_H, CROP_W) batch of
+    representative crops) weights and activations are statically quantized
+    (QDQ, per-channel). Without it only MatMul/Gemm weights are quantized
+    dynamically: the pointwise MLPs hold most of ConvNeXt's compute, and
+    dynamic Conv quantization is slower than float on ORT's CPU kernels.
+    """
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if calibration is None:
+        quantize_dynamic(model_path, int8_path, op_types_to_quantize=["MatMul", "Gemm"], weight_type=QuantType.QInt8)
+        return
+
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class CropReader(CalibrationDataReader):
+        def __init__(self):
+            self._batches = (calibration[i:i + 16] for i in range(0, len(calibration), 16))
+
+        def get_next(self):
+            batch = next(self._batches, None)
+            return None if batch is None else {input_name: batch}
+
+    prepared_path = f"{int8_path}.prep"
+    quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+    try:
+        quantize_static(
+            prepared_path, int8_path, CropReader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
         )
+    finally:
+        os.remove(prepared_path)
+
 
+class GenderClassifier:
+    def __init__(self, model_path: str, required_votes: int = 5, stale_timeout: int = 100, confidence_thresh: float = 0.5, device: str = "cpu", max_batch_size: int = 32,
+                 vote_stride: int = 1, min_quality: float = 0.0, min_votes: int = None, early_stop_margin: float = None,
+                 session: ort.InferenceSession = None, profiler=None, io_binding: bool = False):
         try:
-            self.session = ort.InferenceSession(model_path, providers=providers)
+            # A session passed in (see core.registry) is shared; run() is thread-safe
+            if session is None:
+                session = create_gender_session(model_path, device)
+                print(f"Gender ONNX Loaded. Expected Output Shape: {session.get_outputs()[0].shape}")
+            self.session = session
             self.input_name = self.session.get_inputs()[0].name
-            
-            output_details = self.session.get_outputs()[0]
-            self.output_name = output_details.name
-            print(f"Gender ONNX Loaded. Expected Output Shape: {output_details.shape}")
+            self.output_name = self.session.get_outputs()[0].name
+
+            # Models exported with a fixed batch dimension cap the chunk size
+            batch_dim = self.session.get_inputs()[0].shape[0]
+            if isinstance(batch_dim, int) and batch_dim > 0:
+                max_batch_size = min(max_batch_size, batch_dim)
             
         except Exception as e:
             print(f"Warning: Could not load ONNX model at {model_path}. Gender classification disabled.")
             self.session = None
 
+        self.profiler = profiler or NULL_PROFILER
         self.required_votes = required_votes
         self.stale_timeout = stale_timeout
         self.confidence_thresh = confidence_thresh
+        self.max_batch_size = max(1, max_batch_size)
+
+        # Vote scheduling (batched path): space votes `vote_stride` frames apart,
+        # hold out for a crop scoring >= min_quality for up to one more stride,
+        # and lock in after `min_votes` once |male - female| >= early_stop_margin.
+        self.vote_stride = max(1, vote_stride)
+        self.min_quality = min_quality
+        self.min_votes = required_votes if min_votes is None else min(min_votes, required_votes)
+        self.early_stop_margin = early_stop_margin
+
+        # Preprocessing scratch space, reused every frame
+        self._resize_buffer = np.empty((RESIZE_H, RESIZE_W, 3), dtype=np.uint8)
+        self._batch_buffer = np.empty((self.max_batch_size, 3, CROP_H, CROP_W), dtype=np.float32)
+
+        # With IO binding the session reads the batch buffer and writes logits
+        # into a preallocated buffer in place; needs a float (N, k) output
+        self._binding = None
+        if io_binding and self.session is not None:
+            output = self.session.get_outputs()[0]
+            if output.type == "tensor(float)" and len(output.shape) == 2 and isinstance(output.shape[1], int):
+                self._binding = self.session.io_binding()
+                self._output_buffer = np.empty((self.max_batch_size, output.shape[1]), dtype=np.float32)
         
         # State Management
         self.track_cache = {}       
         self.track_buffer = {}      
         self.track_last_seen = {}   
+        self.track_next_vote = {}   # tid -> earliest frame for the next vote
+        self.track_confidence = {}  # tid -> averaged probability of the locked-in decision
+        self._expiry = StaleTrackHeap(stale_timeout)
+
+        # Inference accounting
+        self.stats = {
+            "session_runs": 0,      # ONNX session.run calls
+            "crops_inferred": 0,    # crops sent through the model
+            "resolved": 0,          # tracks with a locked-in decision
+            "votes_on_resolved": 0, # crops spent on those tracks
+            "early_stops": 0,       # resolved before required_votes
+            "skipped_stride": 0,    # crops skipped because no vote was due
+            "skipped_quality": 0,   # crops skipped waiting for a better one
+        }
 
     def get_gender(self, track_id: int, crop: np.ndarray, frame_idx: int) -> str:
         if self.session is None:
             return None
 
         self.track_last_seen[track_id] = frame_idx
+        self._expiry.add(track_id, frame_idx)
 
         if track_id in self.track_cache:
             return self.track_cache[track_id]
@@ -44,12 +241,87 @@ class GenderClassifier:
             self.track_buffer[track_id] = []
 
         logits = self._infer_probs(crop)
-        if logits is not None:
-            self.track_buffer[track_id].append(logits)
+        if logits is None:
+            return None
 
-        # Lock in prediction
-        if len(self.track_buffer[track_id]) >= self.required_votes:
+        return self._add_vote(track_id, logits)
+
+    def get_genders(self, crops: dict, frame_idx: int, occlusion: dict = None, urgent: set = ()) -> dict:
+        """
+        Batched counterpart of get_gender for all tracks visible in one frame.
+
+        `crops` maps track_id -> BGR crop. Tracks without a locked-in decision
+        that are due a vote are classified together in dynamic-batch ONNX
+        calls of at most `max_batch_size` crops each. `occlusion` maps
+        track_id -> fraction of the box hidden by others (see
+        core.quality.box_occlusion); tracks in `urgent` skip the stride and
+        quality checks. Returns track_id -> gender (None while votes are
+        still being collected).
+        """
+        if self.session is None:
+            return {tid: None for tid in crops}
+
+        results = {}
+        vote_ids = []
+        vote_crops = []
+
+        for tid, crop in crops.items():
+            self.track_last_seen[tid] = frame_idx
+            self._expiry.add(tid, frame_idx)
+
+            if tid in self.track_cache:
+                results[tid] = self.track_cache[tid]
+                continue
+
+            results[tid] = None
+            if tid not in self.track_buffer:
+                self.track_buffer[tid] = []
+
+            if tid not in urgent:
+                due = self.track_next_vote.get(tid, frame_idx)
+                if frame_idx < due:
+                    self.stats["skipped_stride"] += 1
+                    continue
+                if self.min_quality > 0 and frame_idx - due < self.vote_stride:
+                    occ = occlusion.get(tid, 0.0) if occlusion else 0.0
+                    if crop_quality(crop, occ) < self.min_quality:
+                        self.stats["skipped_quality"] += 1
+                        continue
+
+            self.track_next_vote[tid] = frame_idx + self.vote_stride
+            vote_ids.append(tid)
+            vote_crops.append(crop)
+
+        if vote_ids:
+            for tid, probs in zip(vote_ids, self._infer_probs_batch(vote_crops)):
+                if probs is not None:
+                    results[tid] = self._add_vote(tid, probs)
+
+        return results
+
+    def get_stats(self) -> dict:
+        """Inference counters plus crops saved against `required_votes` per resolved track."""
+        stats = dict(self.stats)
+        stats["calls_saved"] = stats["resolved"] * self.required_votes - stats["votes_on_resolved"]
+        stats["votes_per_resolved"] = (
+            stats["votes_on_resolved"] / stats["resolved"] if stats["resolved"] else 0.0
+        )
+        return stats
+
+    def _add_vote(self, track_id: int, probs: np.ndarray) -> str:
+        self.track_buffer[track_id].append(probs)
+        n_votes = len(self.track_buffer[track_id])
+
+        avg_probs = None
+        decisive = False
+        if self.early_stop_margin is not None and self.min_votes <= n_votes < self.required_votes:
             avg_probs = np.mean(self.track_buffer[track_id], axis=0)
+            decisive = abs(avg_probs[1] - avg_probs[0]) >= self.early_stop_margin
+
+        # Lock in prediction
+        if n_votes >= self.required_votes or decisive:
+            if avg_probs is None:
+                avg_probs = np.mean(self.track_buffer[track_id], axis=0)
             
             female_prob = avg_probs[0]
             male_prob = avg_probs[1]
@@ -62,28 +334,46 @@ class GenderClassifier:
                 gender = "Male" if male_prob > female_prob else "Female"
             
             self.track_cache[track_id] = gender
+            self.track_confidence[track_id] = float(max_prob)
             del self.track_buffer[track_id] 
+            self.track_next_vote.pop(track_id, None)
+
+            self.stats["resolved"] += 1
+            self.stats["votes_on_resolved"] += n_votes
+            if decisive:
+                self.stats["early_stops"] += 1
             return gender
 
         return None
 
+    def cache_sizes(self) -> dict:
+        """Entries held in each per-track state dict (grows with unexpired tracks)."""
+        return {
+            "decided": len(self.track_cache),
+            "voting": len(self.track_buffer),
+            "seen": len(self.track_last_seen),
+            "scheduled": len(self.track_next_vote),
+        }
+
     def clean_stale_tracks(self, current_frame: int):
-        stale_ids = [
-            tid for tid, last_seen in self.track_last_seen.items() 
-            if (current_frame - last_seen) > self.stale_timeout
-        ]
-        for tid in stale_ids:
+        for tid in self._expiry.expire(current_frame, self.track_last_seen.get):
             self.track_cache.pop(tid, None)
             self.track_buffer.pop(tid, None)
             self.track_last_seen.pop(tid, None)
+            self.track_next_vote.pop(tid, None)
+            self.track_confidence.pop(tid, None)
 
     def _infer_probs(self, crop: np.ndarray) -> np.ndarray:
-        processed = self._preprocess(crop)
+        with self.profiler.stage("crop_preprocess"):
+            processed = self._preprocess(crop)
         if processed is None:
             return None
 
-        outputs = self.session.run([self.output_name], {self.input_name: processed})
-        logits = outputs[0].flatten()
+        with self.profiler.stage("gender_onnx"):
+            logits = self._run(processed)
+        self.stats["session_runs"] += 1
+        self.stats["crops_inferred"] += 1
+        logits = logits.flatten()
         if logits.shape[0] != 2:
             print("Unexpected gender output shape:", logits.shape)
             return None
@@ -94,31 +384,53 @@ class GenderClassifier:
 
         return probs
 
-    def _preprocess(self, crop: np.ndarray) -> np.ndarray:
-        h, w = crop.shape[:2]
-        if h == 0 or w == 0:
-            return None
+    def _infer_probs_batch(self, crops: list) -> list:
+        """Softmax probabilities per crop (None for crops that cannot be preprocessed)."""
+        probs = [None] * len(crops)
 
-        # 85% Crop to preserve face/chin on steep CCTV angles
-        crop = crop[: int(h * 0.85), :]
-        if crop.size == 0:
-            return None
+        for start in range(0, len(crops), self.max_batch_size):
+            # Preprocess the chunk straight into the shared NCHW buffer
+            batch_idx = []
+            with self.profiler.stage("crop_preprocess"):
+                for i in range(start, min(start + self.max_batch_size, len(crops))):
+                    if self._preprocess_into(crops[i], self._batch_buffer[len(batch_idx)]):
+                        batch_idx.append(i)
+            if not batch_idx:
+                continue
 
-        # Replicate PyTorch Resize((256, 128)) then CenterCrop((224, 112))
-        crop = cv2.resize(crop, (128, 256))
-        
-        start_y = (256 - 224) // 2
-        start_x = (128 - 112) // 2
-        crop = crop[start_y:start_y+224, start_x:start_x+112]
+            batch = self._batch_buffer[:len(batch_idx)]
+            with self.profiler.stage("gender_onnx"):
+                outputs = self._run(batch)
+            self.stats["session_runs"] += 1
+            self.stats["crops_inferred"] += len(batch_idx)
+            logits = outputs.reshape(len(batch_idx), -1)
+            if logits.shape[1] != 2:
+                print("Unexpected gender output shape:", outputs.shape)
+                return probs
+
+            # Row-wise softmax
+            exp_logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+            batch_probs = exp_logits / exp_logits.sum(axis=1, keepdims=True)
 
-        crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+            for i, p in zip(batch_idx, batch_probs):
+                probs[i] = p
 
-        crop = crop.astype(np.float32) / 255.0
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        crop = (crop - mean) / std
+        return probs
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """Logits for a preprocessed batch; with IO binding a view of the output buffer, valid until the next run."""
+        if self._binding is None:
+            return self.session.run([self.output_name], {self.input_name: batch})[0]
+        out = self._output_buffer[:len(batch)]
+        self._binding.bind_cpu_input(self.input_name, batch)
+        self._binding.bind_output(self.output_name, "cpu", 0, np.float32, out.shape, out.ctypes.data)
+        self.session.run_with_iobinding(self._binding)
+        return out
 
-        crop = np.transpose(crop, (2, 0, 1))
-        crop = np.expand_dims(crop, axis=0)
+    def _preprocess(self, crop: np.ndarray) -> np.ndarray:
+        if not self._preprocess_into(crop, self._batch_buffer[0]):
+            return None
+        return self._batch_buffer[:1]
 
-        return crop
+    def _preprocess_into(self, crop: np.ndarray, out: np.ndarray) -> bool:
+        return preprocess_into(crop, out, self._resize_buffer)
@@ -0,0 +1,76 @@
+import config
+from core.counter import TempleCounter
+from core.detector import load_detector
+from core.registry import SharedYOLO
+from core.tracks import make_tracker, track_boxes
+from utils.profiling import NULL_PROFILER
+
+
+class MultiStreamCounter:
+    """
+    Several gates/cameras counted in one process with batched detection.
+
+    Each stream keeps its own TempleCounter (gate line, crossing state,
+    gender votes and tallies) and its own ByteTrack tracker, but the
+    frames of all streams that need a detection this step go through the
+    detector as one batch. Tracked boxes are handed to each stream's
+    counter through its replay queue, so counting, DETECT_STRIDE
+    propagation and gender scheduling work exactly as for one stream.
+    With DETECT_ROI_PAD_PX set each stream contributes only its gate region
+    to the batch. `draw` is passed on to each stream's TempleCounter.
+    """
+
+    def __init__(self, gate_lines, detector=None, gender_session=None, profiler=None, draw=True):
+        self.profiler = profiler or NULL_PROFILER
+        self.detector = detector if detector is not None else load_detector()
+
+        self.engines = []
+        self.trackers = []
+        for gate_line in gate_lines:
+            engine = TempleCounter(
+                # Own handle per stream: the counter never tracks through it,
+                # but nothing can leak tracker state between streams either
+                detector=SharedYOLO.view_of(self.detector),
+                gender_session=gender_session,
+                profiler=self.profiler,
+                draw=draw,
+            )
+            engine.set_gate_line(gate_line)
+            self.engines.append(engine)
+            self.trackers.append(make_tracker())
+
+        self.detector_calls = 0
+        self.frames_detected = 0
+
+    def analyze_frames(self, frames):
+        """
+        One step over the streams with a new frame.
+
+        `frames` maps stream index -> (frame_idx, frame); frame indices are
+        per stream. Returns stream index -> TempleCounter.analyze_frame
+        output (plot_im, labels, in_count, out_count).
+        """
+        detect = [i for i, (frame_idx, _) in frames.items() if self.engines[i].should_detect(frame_idx)]
+        if detect:
+            rois = {}
+            for i in detect:
+                frame = frames[i][1]
+                rois[i] = self.engines[i].detection_roi(frame.shape) or (0, 0, frame.shape[1], frame.shape[0])
+            with self.profiler.stage("detect"):
+                results = self.detector.predict(
+                    [frames[i][1][y0:y1, x0:x1] for i, (x0, y0, x1, y1) in rois.items()],
+                    classes=config.TARGET_CLASSES,
+                    conf=config.CONF_THRESH,
+                    iou=config.IOU_THRESH,
+                    verbose=False,
+                )
+            self.detector_calls += 1
+            self.frames_detected += len(detect)
+            with self.profiler.stage("track"):
+                for i, result in zip(detect, results):
+                    x0, y0 = rois[i][:2]
+                    self.engines[i].counter.replay_queue.append(
+                        track_boxes(self.trackers[i], result.boxes, frames[i][1], offset=(x0, y0))
+                    )
+
+        return {i: self.engines[i].analyze_frame(frame, frame_idx) for i, (frame_idx, frame) in frames.items()}
@@ -0,0 +1,52 @@
+import numpy as np
+import cv2
+
+# Crops at least this tall (px) get full size credit
+FULL_SIZE_HEIGHT = 160
+# Laplacian variance at which a crop counts as half-sharp
+SHARPNESS_REF = 100.0
+
+
+def box_occlusion(boxes: np.ndarray) -> np.ndarray:
+    """
+    Fraction of each box covered by its most-overlapping neighbour.
+
+    `boxes` is an (N, 4) xyxy array; returns an (N,) array in [0, 1].
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) < 2:
+        return np.zeros(len(boxes), dtype=np.float32)
+
+    x1, y1, x2, y2 = boxes.T
+    iw = np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :])
+    ih = np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :])
+    inter = np.clip(iw, 0, None) * np.clip(ih, 0, None)
+    np.fill_diagonal(inter, 0)
+
+    area = np.maximum((x2 - x1) * (y2 - y1), 1.0)
+    return np.minimum(inter.max(axis=1) / area, 1.0)
+
+
+def crop_quality(crop: np.ndarray, occlusion: float = 0.0) -> float:
+    """
+    Cheap 0-1 score of how useful a person crop is for gender voting.
+
+    Combines crop height, a standing-person aspect ratio, sharpness
+    (variance of the Laplacian) and how much of the box another box covers.
+    """
+    h, w = crop.shape[:2]
+    if h == 0 or w == 0:
+        return 0.0
+
+    size_score = min(1.0, h / FULL_SIZE_HEIGHT)
+
+    # Standing people are roughly 2-4x taller than wide; squat boxes are
+    # usually truncated or merged, very thin ones are slivers at the edge.
+    aspect = h / w
+    aspect_score = min(1.0, max(0.0, aspect - 1.0), max(0.0, 5.0 - aspect))
+
+    gray = cv2.cvtColor(cv2.resize(crop, (64, 128)), cv2.COLOR_BGR2GRAY)
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+    sharp_score = sharpness / (sharpness + SHARPNESS_REF)
+
+    return size_score * aspect_score * sharp_score * (1.0 - float(occlusion))
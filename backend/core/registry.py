@@ -0,0 +1,87 @@
+import threading
+
+import numpy as np
+import onnxruntime as ort
+from ultralytics import YOLO
+
+import config
+from core.detector import DetectorYOLO, detector_path, load_detector
+from core.gender import CROP_H, CROP_W, create_gender_session, gender_model_path
+
+
+class SharedYOLO(DetectorYOLO):
+    """
+    Per-job YOLO handle that shares another instance's weights.
+
+    The underlying nn.Module is the same object, but the predictor (and the
+    ByteTrack state hanging off it), callbacks and overrides are per-handle,
+    so concurrent jobs track independently without reloading the weights.
+    """
+
+    @classmethod
+    def view_of(cls, base: YOLO) -> "SharedYOLO":
+        view = cls.__new__(cls)
+        view.__dict__.update(base.__dict__)
+        view.predictor = None
+        view.callbacks = {event: list(fns) for event, fns in base.callbacks.items()}
+        view.overrides = dict(base.overrides)
+        return view
+
+    def __repr__(self):
+        # Solutions log their whole config; keep the module tree out of it
+        return f"SharedYOLO({self.ckpt_path or self.model_name})"
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the detector and gender models.
+
+    `load()` reads the weights once and runs a dummy inference through each
+    model so the first job does not pay for lazy initialisation. Jobs then
+    get a `detector()` handle with their own tracker and the shared
+    `gender_session()`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._detector = None
+        self._gender_session = None
+        self._loaded = False
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+
+            detector = load_detector()
+            # Builds the predictor and fuses Conv+BN once, before jobs share the module
+            detector.predict(
+                np.zeros((640, 640, 3), dtype=np.uint8),
+                classes=config.TARGET_CLASSES, verbose=False,
+            )
+            self._detector = detector
+            print(f"Detector loaded and warmed up: {detector_path()} ({config.DETECTOR_BACKEND})")
+
+            gender_path = gender_model_path()
+            try:
+                session = create_gender_session(gender_path, config.DEVICE)
+                dummy = np.zeros((1, 3, CROP_H, CROP_W), dtype=np.float32)
+                session.run(None, {session.get_inputs()[0].name: dummy})
+                self._gender_session = session
+                print(f"Gender ONNX loaded and warmed up: {gender_path}")
+            except Exception:
+                print(f"Warning: Could not load ONNX model at {gender_path}. Gender classification disabled.")
+
+            self._loaded = True
+
+    def detector(self) -> YOLO:
+        """A per-job detector handle sharing the registry's weights."""
+        self.load()
+        return SharedYOLO.view_of(self._detector)
+
+    def gender_session(self) -> ort.InferenceSession:
+        self.load()
+        return self._gender_session
+
+
+registry = ModelRegistry()
@@ -0,0 +1,77 @@
+import heapq
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Boxes
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import YAML, IterableSimpleNamespace
+from ultralytics.utils.checks import check_yaml
+
+import config
+
+
+def make_tracker():
+    """A fresh ByteTrack tracker configured from TRACKER_CONFIG."""
+    return BYTETracker(args=IterableSimpleNamespace(**YAML.load(check_yaml(config.TRACKER_CONFIG))))
+
+
+def track_boxes(tracker, boxes, frame, offset=(0, 0)):
+    """
+    Update `tracker` with one frame's detections and return the tracked boxes.
+
+    `boxes` are ultralytics Boxes, detected on `frame` or on a crop of it
+    whose top-left corner is at `offset`; tracking and the returned Boxes
+    (with ids) are in full-frame coordinates. None when no track is
+    confirmed this frame.
+    """
+    data = boxes.data.cpu().numpy().astype(np.float32)
+    if offset != (0, 0):
+        data[:, [0, 2]] += offset[0]
+        data[:, [1, 3]] += offset[1]
+    shape = frame.shape[:2]
+    tracks = tracker.update(Boxes(data, shape), frame)
+    if len(tracks) == 0:
+        return None
+    return Boxes(torch.as_tensor(tracks[:, :-1], dtype=torch.float32), shape)
+
+
+class StaleTrackHeap:
+    """
+    Finds tracks unseen for more than `timeout` frames without scanning them all.
+
+    Holds one (deadline, track_id) entry per known track, where deadline is
+    the last frame at which the track still counts as fresh. `expire()` only
+    pops entries whose deadline has passed and re-checks them against
+    `last_seen(track_id)`: tracks seen since then are pushed back with a new
+    deadline, the rest are returned as stale. Per-frame cost is O(log n) per
+    due entry instead of O(n) over every track.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._heap = []
+        self._queued = set()
+
+    def __len__(self):
+        return len(self._queued)
+
+    def add(self, track_id, frame_idx):
+        """Start watching a track (no-op if it is already watched)."""
+        if track_id not in self._queued:
+            self._queued.add(track_id)
+            heapq.heappush(self._heap, (frame_idx + self.timeout, track_id))
+
+    def expire(self, frame_idx, last_seen):
+        """Stale track ids at `frame_idx`; `last_seen(tid)` returns a frame or None if already gone."""
+        stale = []
+        while self._heap and self._heap[0][0] < frame_idx:
+            _, tid = heapq.heappop(self._heap)
+            seen = last_seen(tid)
+            if seen is None:
+                self._queued.discard(tid)
+            elif frame_idx - seen > self.timeout:
+                self._queued.discard(tid)
+                stale.append(tid)
+            else:
+                heapq.heappush(self._heap, (seen + self.timeout, tid))
+        return stale
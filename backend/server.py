@@ -1,24 +1,49 @@
 import os
 import sys
+import asyncio
 import uuid
 import json
-import time
 import threading
+import time
 import shutil
 import subprocess
+from contextlib import asynccontextmanager
 
 import cv2
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import List, Optional
 
 import config
 from core.counter import TempleCounter
+from core.multi import MultiStreamCounter
+from core.registry import registry
 from calibrate import auto_calibrate_gate
-from utils.video_io import get_video_properties, create_video_writer
-
-app = FastAPI(title="Temple Analytics API")
+from utils.video_io import get_video_properties, open_video_encoder
+from utils.pipeline import FramePipeline
+from utils.scheduler import JobScheduler
+from utils.job_store import JobStore, SQLiteJobBackend
+from utils.progress import ProgressHub
+from utils.live_source import LatestFrameReader, is_file_source, parse_source, redact_source
+from utils.render import RENDER_MODES, FrameSelector
+from utils.chunked import run_chunked
+from utils.metrics import JobMetrics, render_prometheus
+from utils.profiling import StageProfiler
+from utils.event_log import CrossingEventLog, aggregate_events, event_log_path, job_event_logs, list_event_logs
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm up the shared models once, before the first job arrives
+    jobs.recover(_mark_interrupted)
+    progress.bind(asyncio.get_running_loop())
+    registry.load()
+    scheduler.start()
+    yield
+
+
+app = FastAPI(title="Temple Analytics API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,12 +53,97 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ── In-memory job store ──────────────────────────────────────────────────────
-jobs: dict = {}
+# ── Job store: in-memory hot set over SQLite ─────────────────────────────────
+jobs = JobStore(
+    backend=SQLiteJobBackend(config.JOB_DB_PATH) if config.JOB_DB_PATH else None,
+    max_hot=config.JOB_CACHE_SIZE,
+    ttl=config.JOB_CACHE_TTL,
+)
 
 
 class ProcessRequest(BaseModel):
     filename: str
+    priority: int = 0   # lower runs first; FIFO within a priority
+    render: str = "full"  # "full" | "sampled" | "events" | "none" (analytics only)
+    chunked: bool = False  # split into segments counted in parallel processes (needs render="none")
+    recorded_at: Optional[float] = None  # unix time of the first frame; defaults to file mtime minus duration
+
+
+class LiveRequest(BaseModel):
+    source: str                                 # RTSP/HTTP URL or camera index ("0"); files go to /api/process
+    gate_line: Optional[List[List[int]]] = None  # [[x1, y1], [x2, y2]]; defaults to config.GATE_LINE
+
+
+class MultiLiveRequest(BaseModel):
+    streams: List[LiveRequest]                  # counted together with batched detection
+
+
+# Running live streams: job_id -> stop Event
+live_streams: dict = {}
+
+
+def _live_source_count():
+    """Sources being counted by live jobs (multi-source jobs count each one)."""
+    return sum(len((jobs.get(job_id) or {}).get("streams") or [None]) for job_id in list(live_streams))
+
+
+def _update_queue_positions(positions: dict):
+    for job_id, job in list(jobs.items()):
+        if job["status"] == "queued" and job["queue_position"] != positions.get(job_id):
+            job["queue_position"] = positions.get(job_id)
+            progress.publish(job_id)
+
+
+def _run_job(job_id: str, cancel: threading.Event):
+    video_path = os.path.join(config.INPUT_DIR, jobs[job_id]["filename"])
+    try:
+        _run_pipeline(job_id, video_path, cancel)
+    finally:
+        jobs.save(job_id)
+        progress.publish(job_id)
+
+
+def _new_metrics(total_frames=None):
+    return JobMetrics(
+        total_frames,
+        fps_window=config.METRICS_FPS_WINDOW_S,
+        interval=config.METRICS_INTERVAL_S,
+    )
+
+
+def _open_event_log(job_id: str, start_time=None, fps=None, stream=None):
+    os.makedirs(config.LOG_DIR, exist_ok=True)
+    path = event_log_path(config.LOG_DIR, job_id, stream)
+    if stream is None:
+        jobs[job_id]["event_log"] = os.path.basename(path)
+    return CrossingEventLog(
+        path, start_time=start_time, fps=fps,
+        flush_events=config.EVENT_LOG_FLUSH_EVENTS,
+        flush_seconds=config.EVENT_LOG_FLUSH_SECONDS,
+    )
+
+
+def _mark_interrupted(job: dict):
+    job["errors"].append({
+        "code": "INTERRUPTED",
+        "message": f"Server restarted while job was {job['status']}.",
+        "layman": "The server was restarted before this video finished processing. Please start the analysis again."
+    })
+    job["status"] = "error"
+    job["queue_position"] = None
+    job["done"] = True
+
+
+# ── Progress channel: pipeline threads -> SSE subscribers ───────────────────
+progress = ProgressHub(max_rate=config.SSE_MAX_EVENT_RATE)
+
+
+# ── Job scheduler: bounded worker pool + priority queue ──────────────────────
+scheduler = JobScheduler(
+    _run_job,
+    workers=config.MAX_CONCURRENT_JOBS,
+    on_queue_change=_update_queue_positions,
+)
 
 
 # ── GET /api/videos ──────────────────────────────────────────────────────────
@@ -64,15 +174,31 @@ async def upload_video(file: UploadFile = File(...)):
 # ── POST /api/process ────────────────────────────────────────────────────────
 @app.post("/api/process")
 def start_processing(req: ProcessRequest):
-    """Start processing a video. Returns a job_id for tracking progress."""
+    """Queue a video for processing. Returns a job_id for tracking progress."""
     video_path = os.path.join(config.INPUT_DIR, req.filename)
     if not os.path.exists(video_path):
         raise HTTPException(status_code=404, detail=f"Video not found: {req.filename}")
+    if req.render not in RENDER_MODES:
+        raise HTTPException(status_code=400, detail=f"render must be one of: {', '.join(RENDER_MODES)}")
+    if req.chunked and req.render != "none":
+        raise HTTPException(status_code=400, detail='Chunked processing is analytics-only; use render="none".')
 
     job_id = str(uuid.uuid4())[:8]
-    jobs[job_id] = {
-        "status": "starting",
-        "filename": req.filename,
+    jobs[job_id] = _new_job(req.filename, render=req.render)
+    jobs[job_id]["chunked"] = req.chunked
+    jobs[job_id]["recorded_at"] = req.recorded_at
+
+    scheduler.submit(job_id, priority=req.priority)
+
+    return {"job_id": job_id, "queue_position": jobs[job_id]["queue_position"]}
+
+
+def _new_job(filename: str, status: str = "queued", render: str = "full") -> dict:
+    return {
+        "status": status,
+        "queue_position": None,
+        "filename": filename,
+        "render": render,
         "frame": 0,
         "total_frames": 0,
         "in_count": 0,
@@ -85,18 +211,340 @@ def start_processing(req: ProcessRequest):
         "errors": [],
         "timeline": [],        # [{frame, in_count, out_count, male, female, unknown}]
         "output_file": None,
+        "clips": None,         # sampled/events renders: [first, last] source frames in the output
+        "chunked": False,
+        "segments": None,      # chunked runs: [start, end) frame range per worker segment
+        "gender_stats": None,  # GenderClassifier inference accounting
+        "calibration": None,   # gate calibration: status, ratio, frames used, stop reason, convergence trace
+        "recorded_at": None,   # unix time of the first frame (event log timestamps)
+        "event_log": None,     # crossing-event log file in LOG_DIR
+        "pipeline": None,      # per-stage throughput and queue occupancy
+        "metrics": None,       # rolling FPS, stage timings, ETA, tracks, gender caches
+        "live": None,          # live sources only: reader/processing stats
+        "streams": None,       # multi-source live jobs: per-source counts and reader stats
         "done": False,
     }
 
-    thread = threading.Thread(target=_run_pipeline, args=(job_id, video_path), daemon=True)
+
+# ── POST /api/live ───────────────────────────────────────────────────────────
+@app.post("/api/live")
+def start_live(req: LiveRequest):
+    """Start counting a live camera/RTSP source. Runs until cancelled."""
+    _check_live_source(req.source)
+    if _live_source_count() >= config.MAX_LIVE_STREAMS:
+        raise HTTPException(status_code=429, detail=f"At most {config.MAX_LIVE_STREAMS} live streams can run at once.")
+
+    job_id = str(uuid.uuid4())[:8]
+    # Never store or expose camera credentials from the URL
+    jobs[job_id] = _new_job(redact_source(req.source), status="connecting", render="none")
+
+    stop = threading.Event()
+    live_streams[job_id] = stop
+    # Live jobs never finish on their own, so they get a thread of their own
+    # instead of holding one of the scheduler's workers forever.
+    thread = threading.Thread(target=_run_live, args=(job_id, req, stop), daemon=True)
     thread.start()
 
     return {"job_id": job_id}
 
 
-def _run_pipeline(job_id: str, video_path: str):
+def _check_live_source(source: str):
+    if is_file_source(source):
+        raise HTTPException(
+            status_code=400, detail="Recorded files are counted with /api/process, not as live sources.",
+        )
+
+
+def _run_live(job_id: str, req: LiveRequest, stop: threading.Event):
+    """Continuous counting over a latest-frame-wins reader."""
+    job = jobs[job_id]
+    reader = LatestFrameReader(
+        parse_source(req.source),
+        reconnect_delay=config.LIVE_RECONNECT_DELAY,
+        max_reconnect_delay=config.LIVE_MAX_RECONNECT_DELAY,
+    ).start()
+    event_log = engine = None
+
+    try:
+        profiler = StageProfiler(window=config.METRICS_WINDOW_FRAMES)
+        metrics = _new_metrics()
+        event_log = _open_event_log(job_id)
+        engine = TempleCounter(
+            detector=registry.detector(),
+            gender_session=registry.gender_session(),
+            profiler=profiler,
+            draw=False,
+        )
+        if req.gate_line:
+            engine.set_gate_line([tuple(p) for p in req.gate_line])
+
+        next_sample = time.perf_counter()
+        processed = 0
+
+        while not stop.is_set():
+            seq, frame = reader.read(timeout=1.0)
+            if frame is None:
+                # Waiting for the first frame or a reconnect
+                job["status"] = "reconnecting" if reader.reconnects else "connecting"
+                job["live"] = dict(reader.stats(), processing_fps=round(metrics.fps(), 2))
+                progress.publish(job_id)
+                continue
+
+            # Capture numbers keep tracker/cache timeouts in source time even
+            # when frames are skipped because inference fell behind.
+            _, _, in_count, out_count = engine.analyze_frame(frame, seq)
+            event_log.extend(engine.pop_crossings())
+            profiler.end_frame()
+            processed += 1
+            metrics.tick(processed)
+            if metrics.due():
+                job["metrics"] = metrics.snapshot(engine, profiler)
+
+            now = time.perf_counter()
+            job["status"] = "live"
+            job["frame"] = seq
+            job["in_count"] = in_count
+            job["out_count"] = out_count
+            job["male"] = engine.male_count
+            job["female"] = engine.female_count
+            job["unknown"] = engine.unknown_count
+            job["fps"] = round(reader.source_fps)
+            job["live"] = dict(reader.stats(), processing_fps=round(metrics.fps(), 2))
+
+            if now >= next_sample:
+                job["timeline"].append({
+                    "frame": seq,
+                    "timestamp": time.time(),
+                    "in_count": in_count,
+                    "out_count": out_count,
+                    "male": engine.male_count,
+                    "female": engine.female_count,
+                    "unknown": engine.unknown_count,
+                })
+                # Bounded rolling window for the chart
+                del job["timeline"][:-config.LIVE_TIMELINE_POINTS]
+                next_sample = now + config.LIVE_SAMPLE_SECONDS
+                jobs.save(job_id)
+
+            progress.publish(job_id)
+
+        job["status"] = "stopped"
+
+    except Exception as e:
+        job["errors"].append({
+            "code": "PIPELINE_ERROR",
+            "message": str(e),
+            "layman": "An unexpected error occurred while processing the live feed. Please try again."
+        })
+        job["status"] = "error"
+    finally:
+        reader.stop()
+        if event_log is not None:
+            if engine is not None:
+                engine.flush_pending_entries()
+                event_log.extend(engine.pop_crossings())
+                job["unknown"] = engine.unknown_count
+            event_log.close()
+        live_streams.pop(job_id, None)
+        job["done"] = True
+        jobs.save(job_id)
+        progress.publish(job_id)
+
+
+# ── POST /api/live/multi ─────────────────────────────────────────────────────
+@app.post("/api/live/multi")
+def start_live_multi(req: MultiLiveRequest):
+    """
+    Count several live sources (gates/cameras) in one job. Each source keeps
+    its own tracker, gate line and tallies; detection is batched across them.
+    """
+    if not req.streams:
+        raise HTTPException(status_code=400, detail="At least one stream is required.")
+    for stream in req.streams:
+        _check_live_source(stream.source)
+    if _live_source_count() + len(req.streams) > config.MAX_LIVE_STREAMS:
+        raise HTTPException(status_code=429, detail=f"At most {config.MAX_LIVE_STREAMS} live streams can run at once.")
+
+    job_id = str(uuid.uuid4())[:8]
+    sources = ", ".join(redact_source(s.source) for s in req.streams)
+    jobs[job_id] = _new_job(sources, status="connecting", render="none")
+    jobs[job_id]["streams"] = [_new_stream(s.source) for s in req.streams]
+
+    stop = threading.Event()
+    live_streams[job_id] = stop
+    thread = threading.Thread(target=_run_live_multi, args=(job_id, req, stop), daemon=True)
+    thread.start()
+
+    return {"job_id": job_id}
+
+
+def _new_stream(source: str) -> dict:
+    return {
+        "source": redact_source(source),
+        "status": "connecting",
+        "frame": 0,
+        "in_count": 0,
+        "out_count": 0,
+        "male": 0,
+        "female": 0,
+        "unknown": 0,
+        "live": None,
+        "event_log": None,
+    }
+
+
+def _run_live_multi(job_id: str, req: MultiLiveRequest, stop: threading.Event):
+    """Continuous counting of several sources, one batched detector call per step."""
+    job = jobs[job_id]
+    readers = [
+        LatestFrameReader(
+            parse_source(s.source),
+            reconnect_delay=config.LIVE_RECONNECT_DELAY,
+            max_reconnect_delay=config.LIVE_MAX_RECONNECT_DELAY,
+        ).start()
+        for s in req.streams
+    ]
+    streams = [dict(s) for s in job["streams"]]
+    event_logs = []
+    engine = None
+
+    try:
+        profiler = StageProfiler(window=config.METRICS_WINDOW_FRAMES)
+        metrics = _new_metrics()
+        engine = MultiStreamCounter(
+            [[tuple(p) for p in s.gate_line] if s.gate_line else config.GATE_LINE for s in req.streams],
+            detector=registry.detector(),
+            gender_session=registry.gender_session(),
+            profiler=profiler,
+            draw=False,
+        )
+        for i, stream in enumerate(streams):
+            event_logs.append(_open_event_log(job_id, stream=i))
+            stream["event_log"] = os.path.basename(event_logs[i].path)
+
+        next_sample = time.perf_counter()
+        processed = 0
+
+        while not stop.is_set():
+            # A short wait per source lets frames arriving together share a
+            # batch without one slow camera holding back the others.
+            deadline = time.perf_counter() + config.LIVE_BATCH_WAIT_S
+            frames = {}
+            for i, reader in enumerate(readers):
+                seq, frame = reader.read(timeout=max(0.0, deadline - time.perf_counter()))
+                if frame is not None:
+                    frames[i] = (seq, frame)
+
+            if frames:
+                results = engine.analyze_frames(frames)
+                profiler.end_frame()
+                processed += len(frames)
+                metrics.tick(processed)
+                if metrics.due():
+                    job["metrics"] = metrics.snapshot(profiler=profiler)
+
+            for i, (reader, stream) in enumerate(zip(readers, streams)):
+                stream["live"] = reader.stats()
+                if i not in frames:
+                    if not reader.connected:
+                        stream["status"] = "reconnecting" if reader.reconnects else "connecting"
+                    continue
+                counter = engine.engines[i]
+                event_logs[i].extend(counter.pop_crossings())
+                _, _, in_count, out_count = results[i]
+                stream.update(
+                    status="live", frame=frames[i][0], in_count=in_count, out_count=out_count,
+                    male=counter.male_count, female=counter.female_count, unknown=counter.unknown_count,
+                )
+
+            job["streams"] = [dict(s) for s in streams]
+            for key in ("in_count", "out_count", "male", "female", "unknown"):
+                job[key] = sum(s[key] for s in streams)
+            job["status"] = "live" if any(s["status"] == "live" for s in streams) else streams[0]["status"]
+            job["frame"] = processed
+            job["live"] = {
+                "sources": len(readers),
+                "connected": sum(r.connected for r in readers),
+                "processing_fps": round(metrics.fps(), 2),
+                "frames_per_batch": round(engine.frames_detected / engine.detector_calls, 2)
+                if engine.detector_calls else 0.0,
+            }
+
+            now = time.perf_counter()
+            if frames and now >= next_sample:
+                job["timeline"].append(dict(
+                    frame=processed, timestamp=time.time(),
+                    **{key: job[key] for key in ("in_count", "out_count", "male", "female", "unknown")},
+                ))
+                del job["timeline"][:-config.LIVE_TIMELINE_POINTS]
+                next_sample = now + config.LIVE_SAMPLE_SECONDS
+                jobs.save(job_id)
+
+            progress.publish(job_id)
+
+        job["status"] = "stopped"
+
+    except Exception as e:
+        job["errors"].append({
+            "code": "PIPELINE_ERROR",
+            "message": str(e),
+            "layman": "An unexpected error occurred while processing the live feeds. Please try again."
+        })
+        job["status"] = "error"
+    finally:
+        for reader in readers:
+            reader.stop()
+        for i, event_log in enumerate(event_logs):
+            if engine is not None:
+                counter = engine.engines[i]
+                counter.flush_pending_entries()
+                event_log.extend(counter.pop_crossings())
+                streams[i]["unknown"] = counter.unknown_count
+            event_log.close()
+        if engine is not None:
+            job["streams"] = [dict(s) for s in streams]
+            job["unknown"] = sum(s["unknown"] for s in streams)
+        live_streams.pop(job_id, None)
+        job["done"] = True
+        jobs.save(job_id)
+        progress.publish(job_id)
+
+
+# ── POST /api/cancel/{job_id} ────────────────────────────────────────────────
+@app.post("/api/cancel/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    if job_id not in jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = jobs[job_id]
+    if job["done"]:
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+
+    if job_id in live_streams:
+        live_streams[job_id].set()
+        return {"job_id": job_id, "cancelled": True, "was": "live"}
+
+    where = scheduler.cancel(job_id)
+    if where == "queued":
+        _mark_cancelled(job)
+        jobs.save(job_id)
+        progress.publish(job_id)
+    # Running jobs stop at the next frame and mark themselves cancelled
+    return {"job_id": job_id, "cancelled": where is not None, "was": where}
+
+
+def _mark_cancelled(job: dict):
+    job["status"] = "cancelled"
+    job["queue_position"] = None
+    job["done"] = True
+
+
+def _run_pipeline(job_id: str, video_path: str, cancel: threading.Event = None):
     """Background pipeline runner."""
     job = jobs[job_id]
+    job["status"] = "starting"
+    job["queue_position"] = None
+    progress.publish(job_id)
 
     try:
         os.makedirs(config.ANNOTATED_DIR, exist_ok=True)
@@ -118,9 +566,20 @@ def _run_pipeline(job_id: str, video_path: str):
             job["done"] = True
             return
 
+        # Built up front so calibration can track with the counter's own model
+        # and hand its tracks (and tracker state) straight to the main pass.
+        profiler = StageProfiler(window=config.METRICS_WINDOW_FRAMES)
+        engine = TempleCounter(
+            detector=registry.detector(),
+            gender_session=registry.gender_session(),
+            profiler=profiler,
+            draw=job.get("render", "full") != "none",
+        )
+
         # ── Calibration ──────────────────────────────────────────────────
         if config.AUTO_CALIBRATE:
             job["status"] = "calibrating"
+            progress.publish(job_id)
 
             if total_frames < config.MIN_FRAMES_FOR_CALIBRATION:
                 job["warnings"].append({
@@ -133,7 +592,22 @@ def _run_pipeline(job_id: str, video_path: str):
                     config.MAX_CALIBRATION_FRAMES,
                     int(total_frames * config.CALIBRATION_FRACTION),
                 )
-                cal_result = auto_calibrate_gate(video_path, frames_to_analyze=dynamic_frames)
+                if config.CALIBRATION_REUSE_TRACKS and not job.get("chunked"):
+                    track_cache = []
+                    cal_result = auto_calibrate_gate(
+                        video_path, frames_to_analyze=dynamic_frames,
+                        model=engine.counter.model, track_cache=track_cache,
+                    )
+                    engine.replay_tracks(track_cache)
+                else:
+                    cal_result = auto_calibrate_gate(
+                        video_path, frames_to_analyze=dynamic_frames,
+                        model=registry.detector(),
+                    )
+                job["calibration"] = {
+                    key: cal_result[key]
+                    for key in ("status", "gate_line", "ratio", "vectors_found", "frames_analyzed", "stopped", "trace")
+                }
 
                 if cal_result["status"] == "chaotic_motion":
                     job["errors"].append({
@@ -150,75 +624,158 @@ def _run_pipeline(job_id: str, video_path: str):
                         "message": cal_result["message"],
                         "layman": cal_result["layman"],
                     })
-                    config.GATE_LINE = cal_result["gate_line"]
+                    engine.set_gate_line(cal_result["gate_line"])
                 elif cal_result["status"] == "success":
-                    config.GATE_LINE = cal_result["gate_line"]
+                    engine.set_gate_line(cal_result["gate_line"])
+
+        if cancel is not None and cancel.is_set():
+            _mark_cancelled(job)
+            return
 
         # ── Processing ───────────────────────────────────────────────────
         job["status"] = "processing"
+        jobs.save(job_id)
+        progress.publish(job_id)
         cap, w, h, fps = get_video_properties(video_path)
         job["fps"] = fps
+        if job.get("recorded_at") is None:
+            # Recorders stamp the file when they close it
+            job["recorded_at"] = os.path.getmtime(video_path) - total_frames / (fps or 25)
 
-        basename = os.path.splitext(os.path.basename(video_path))[0]
-        output_filename = f"temple_output_{basename}.mp4"
-        output_path = os.path.join(config.ANNOTATED_DIR, output_filename)
-        out = create_video_writer(output_path, w, h, fps)
-
-        engine = TempleCounter()
-        frame_count = 0
-        sample_interval = max(1, total_frames // 200)  # ~200 data points for chart
+        if job.get("chunked"):
+            cap.release()
+            _run_chunked(job_id, video_path, total_frames, fps, engine.gate_line, cancel)
+            return
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+        selector = FrameSelector(
+            job.get("render", "full"),
+            sample_every=config.RENDER_SAMPLE_EVERY,
+            pre=config.RENDER_EVENT_PRE_FRAMES,
+            post=config.RENDER_EVENT_POST_FRAMES,
+        )
+        output_filename = output_path = out = None
+        browser_ready = False
+        if selector.writes_video:
+            basename = os.path.splitext(os.path.basename(video_path))[0]
+            prefix = "temple_output" if selector.mode == "full" else f"temple_{selector.mode}"
+            output_filename = f"{prefix}_{basename}.mp4"
+            output_path = os.path.join(config.ANNOTATED_DIR, output_filename)
+            out, browser_ready = open_video_encoder(
+                output_path, w, h, fps,
+                backend=config.VIDEO_ENCODER,
+                preset=config.ENCODER_PRESET,
+                crf=config.ENCODER_CRF,
+                fragmented=config.ENCODER_FRAGMENTED,
+            )
+            if browser_ready:
+                # Fragmented H.264 is playable while it is still being written
+                job["output_file"] = output_filename
 
-            annotated_frame, in_count, out_count = engine.process_frame(frame, frame_count)
-            out.write(annotated_frame)
+        metrics = _new_metrics(total_frames)
+        last_counts = (0, 0)
+        sample_interval = max(1, total_frames // 200)  # ~200 data points for chart
 
-            job["frame"] = frame_count
+        # Inference runs here; decode and annotate+encode run on their own threads
+        def process(frame_idx, frame):
+            if cancel is not None and cancel.is_set():
+                pipeline.stop()
+            nonlocal last_counts
+            plot_im, labels, in_count, out_count = engine.analyze_frame(frame, frame_idx)
+            event_log.extend(engine.pop_crossings())
+            crossed = (in_count, out_count) != last_counts
+            last_counts = (in_count, out_count)
+
+            job["frame"] = frame_idx
             job["in_count"] = in_count
             job["out_count"] = out_count
             job["male"] = engine.male_count
             job["female"] = engine.female_count
             job["unknown"] = engine.unknown_count
 
+            metrics.tick(frame_idx + 1)
+            if metrics.due():
+                job["metrics"] = metrics.snapshot(engine, profiler)
+
             # Sample timeline data for chart
-            if frame_count % sample_interval == 0:
+            if frame_idx % sample_interval == 0:
                 job["timeline"].append({
-                    "frame": frame_count,
+                    "frame": frame_idx,
                     "in_count": in_count,
                     "out_count": out_count,
                     "male": engine.male_count,
                     "female": engine.female_count,
                     "unknown": engine.unknown_count,
                 })
+                job["pipeline"] = pipeline.stats()
+
+            progress.publish(job_id)
+            return frame_idx, plot_im, labels, crossed
+
+        def write(item):
+            frame_idx, plot_im, labels, crossed = item
+            for plot_im, labels in selector.push(frame_idx, (plot_im, labels), crossed):
+                with profiler.stage("annotate"):
+                    engine.annotate(plot_im, labels)
+                with profiler.stage("write"):
+                    out.write(plot_im)
+
+        pipeline = FramePipeline(
+            cap, process, write, queue_size=config.PIPELINE_QUEUE_SIZE, profiler=profiler,
+        )
+        event_log = _open_event_log(job_id, start_time=job["recorded_at"], fps=fps or 25)
+        try:
+            frame_count = pipeline.run()
+            engine.flush_pending_entries()
+            event_log.extend(engine.pop_crossings())
+            job["unknown"] = engine.unknown_count
+        finally:
+            cap.release()
+            try:
+                if out is not None:
+                    out.release()
+            except RuntimeError as enc_err:
+                # Reported on its own so it cannot mask an error raised by the pipeline
+                print(f"Video encoder failed: {enc_err}")
+                job["warnings"].append({
+                    "code": "ENCODER_FAILED",
+                    "message": str(enc_err),
+                    "layman": "The annotated video could not be saved. Counts and analytics are not affected.",
+                })
+                output_filename = None
+                job["output_file"] = None
+            finally:
+                event_log.close()
 
-            frame_count += 1
+        job["pipeline"] = pipeline.stats()
+        job["metrics"] = metrics.snapshot(engine, profiler)
+        print(f"Pipeline stats: {json.dumps(job['pipeline'])}")
 
-        cap.release()
-        out.release()
+        if cancel is not None and cancel.is_set():
+            _mark_cancelled(job)
+            return
 
         # Re-encode to H.264 for browser playback (mp4v is not browser-compatible)
-        job["status"] = "encoding"
-        web_output = output_path.replace(".mp4", "_web.mp4")
-        try:
-            subprocess.run(
-                [
-                    "ffmpeg", "-i", output_path,
-                    "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-                    "-pix_fmt", "yuv420p",
-                    "-movflags", "+faststart",
-                    "-an", "-y", web_output,
-                ],
-                check=True, capture_output=True,
-            )
-            os.replace(web_output, output_path)
-            print(f"Re-encoded to H.264: {output_path}")
-        except FileNotFoundError:
-            print("ffmpeg not found — serving raw mp4v (may not play in browser)")
-        except subprocess.CalledProcessError as enc_err:
-            print(f"ffmpeg re-encode failed: {enc_err.stderr.decode()}")
+        if output_path is not None and not browser_ready:
+            job["status"] = "encoding"
+            progress.publish(job_id)
+            web_output = output_path.replace(".mp4", "_web.mp4")
+            try:
+                subprocess.run(
+                    [
+                        "ffmpeg", "-i", output_path,
+                        "-c:v", "libx264", "-preset", config.ENCODER_PRESET, "-crf", str(config.ENCODER_CRF),
+                        "-pix_fmt", "yuv420p",
+                        "-movflags", "+faststart",
+                        "-an", "-y", web_output,
+                    ],
+                    check=True, capture_output=True,
+                )
+                os.replace(web_output, output_path)
+                print(f"Re-encoded to H.264: {output_path}")
+            except FileNotFoundError:
+                print("ffmpeg not found — serving raw mp4v (may not play in browser)")
+            except subprocess.CalledProcessError as enc_err:
+                print(f"ffmpeg re-encode failed: {enc_err.stderr.decode()}")
 
         # Final timeline point
         job["timeline"].append({
@@ -230,7 +787,16 @@ def _run_pipeline(job_id: str, video_path: str):
             "unknown": engine.unknown_count,
         })
 
+        job["gender_stats"] = engine.gender_classifier.get_stats()
+        print(
+            f"Gender inference: {job['gender_stats']['crops_inferred']} crops in "
+            f"{job['gender_stats']['session_runs']} ONNX calls, "
+            f"{job['gender_stats']['calls_saved']} saved by early stopping"
+        )
+
         job["output_file"] = output_filename
+        if selector.mode in ("sampled", "events"):
+            job["clips"] = selector.clips
         job["status"] = "complete"
         job["done"] = True
 
@@ -244,44 +810,57 @@ def _run_pipeline(job_id: str, video_path: str):
         job["done"] = True
 
 
+def _run_chunked(job_id: str, video_path: str, total_frames: int, fps: int, gate_line,
+                 cancel: threading.Event = None):
+    """Count one long video across a process pool and merge the segments."""
+    job = jobs[job_id]
+    metrics = _new_metrics(total_frames)
+
+    def on_progress(frames_done):
+        job["frame"] = frames_done
+        metrics.tick(frames_done)
+        if metrics.due():
+            job["metrics"] = metrics.snapshot()
+        progress.publish(job_id)
+
+    result = run_chunked(
+        video_path, total_frames, fps, gate_line,
+        workers=config.CHUNK_WORKERS,
+        overlap=int(config.CHUNK_OVERLAP_SECONDS * (fps or 25)),
+        min_seconds=config.CHUNK_MIN_SECONDS,
+        on_progress=on_progress,
+        cancel=cancel,
+    )
+    if result is None:
+        _mark_cancelled(job)
+        return
+
+    for key in ("in_count", "out_count", "male", "female", "unknown", "timeline", "gender_stats", "segments"):
+        job[key] = result[key]
+    event_log = _open_event_log(job_id, start_time=job["recorded_at"], fps=fps or 25)
+    event_log.extend(result["events"])
+    event_log.close()
+    job["frame"] = total_frames
+    print(f"Chunked run merged {len(result['segments'])} segments: IN {job['in_count']}, OUT {job['out_count']}")
+
+    job["status"] = "complete"
+    job["done"] = True
+
+
 # ── GET /api/status/{job_id} (SSE) ───────────────────────────────────────────
 @app.get("/api/status/{job_id}")
-def stream_status(job_id: str):
-    """Server-Sent Events stream for real-time progress updates."""
+async def stream_status(job_id: str):
+    """
+    Server-Sent Events stream for real-time progress updates.
+
+    The first event is a full snapshot ("event": "snapshot"); later events
+    ("event": "delta") carry only changed fields plus newly added
+    warnings/errors, pushed by the pipeline and rate-limited per client.
+    """
     if job_id not in jobs:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    def event_generator():
-        last_frame = -1
-        while True:
-            job = jobs.get(job_id)
-            if job is None:
-                break
-
-            if job["frame"] != last_frame or job["done"]:
-                data = json.dumps({
-                    "status": job["status"],
-                    "frame": job["frame"],
-                    "total_frames": job["total_frames"],
-                    "in_count": job["in_count"],
-                    "out_count": job["out_count"],
-                    "male": job["male"],
-                    "female": job["female"],
-                    "unknown": job["unknown"],
-                    "fps": job["fps"],
-                    "warnings": job["warnings"],
-                    "errors": job["errors"],
-                    "done": job["done"],
-                })
-                yield f"data: {data}\n\n"
-                last_frame = job["frame"]
-
-            if job["done"]:
-                break
-
-            time.sleep(0.25)
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(progress.stream(job_id, jobs.get), media_type="text/event-stream")
 
 
 # ── GET /api/results/{job_id} ────────────────────────────────────────────────
@@ -302,7 +881,67 @@ def get_results(job_id: str):
         "warnings": job["warnings"],
         "errors": job["errors"],
         "output_file": job["output_file"],
+        "render": job.get("render", "full"),
+        "clips": job.get("clips"),
+        "gender_stats": job["gender_stats"],
+        "calibration": job.get("calibration"),
+        "event_log": job.get("event_log"),
+    }
+
+
+# ── GET /api/events/aggregate ────────────────────────────────────────────────
+@app.get("/api/events/aggregate")
+def aggregate_crossings(bucket: int = 3600, start: float = None, end: float = None,
+                        job_id: str = None, filename: str = None):
+    """
+    Crossing totals per time bucket from the event logs in LOG_DIR.
+
+    `bucket` is the bucket width in seconds (3600 = hourly); `start`/`end`
+    bound the event timestamps (unix seconds). Without `job_id`/`filename`
+    every logged job and live stream is included.
+    """
+    if bucket <= 0:
+        raise HTTPException(status_code=400, detail="bucket must be a positive number of seconds")
+
+    if job_id is not None:
+        job_ids = [job_id]
+    elif filename is not None:
+        job_ids = [j["job_id"] for j in jobs.query(filename=filename, limit=100000)]
+    else:
+        job_ids = None
+
+    if job_ids is None:
+        paths = list_event_logs(config.LOG_DIR)
+    else:
+        paths = [p for j in job_ids for p in job_event_logs(config.LOG_DIR, j)]
+
+    return {
+        "bucket": bucket,
+        "logs": len(paths),
+        "buckets": aggregate_events(paths, bucket_seconds=bucket, start=start, end=end),
+    }
+
+
+# ── GET /api/metrics ─────────────────────────────────────────────────────────
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of running jobs' performance metrics."""
+    running = {
+        job_id: (job, job["metrics"])
+        for job_id, job in jobs.items()
+        if not job["done"] and job.get("metrics")
     }
+    return PlainTextResponse(
+        render_prometheus(running, scheduler.stats(), _live_source_count()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+# ── GET /api/jobs ────────────────────────────────────────────────────────────
+@app.get("/api/jobs")
+def list_jobs(filename: str = None, status: str = None, limit: int = 50):
+    """Newest-first job history, optionally filtered by filename and/or status."""
+    return {"jobs": jobs.query(filename=filename, status=status, limit=min(limit, 500))}
 
 
 # ── GET /api/video/{filename} ────────────────────────────────────────────────
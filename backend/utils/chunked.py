@@ -0,0 +1,191 @@
+import multiprocessing as mp
+import queue
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+
+import config
+
+# Per worker process, set by _init_worker
+_worker = {}
+
+
+def plan_segments(total_frames, fps, workers, min_seconds=60):
+    """
+    Split [0, total_frames) into at most `workers` contiguous core ranges of
+    at least `min_seconds` each. Returns [(start, end)] with end exclusive.
+    """
+    min_frames = max(1, int(min_seconds * (fps or 25)))
+    n = max(1, min(workers, total_frames // min_frames))
+    bounds = [round(i * total_frames / n) for i in range(n + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _init_worker(settings, progress_queue, cancel_event):
+    # Spawned workers import a fresh config; replay the parent's runtime values
+    for key, value in settings.items():
+        setattr(config, key, value)
+
+    from core.registry import registry
+    registry.load()
+    _worker.update(registry=registry, progress=progress_queue, cancel=cancel_event)
+
+
+def _process_segment(index, video_path, start, end, overlap, total_frames, gate_line):
+    """
+    Count one segment in a worker process.
+
+    Frames from `start - overlap` warm the tracker up so people already in
+    view at `start` have a history; frames up to `end + overlap` let entries
+    made just before `end` finish their gender vote. Only crossings and
+    entries on frames in [start, end) are reported, so every event belongs
+    to exactly one segment.
+    """
+    from core.counter import TempleCounter
+
+    registry = _worker["registry"]
+    engine = TempleCounter(detector=registry.detector(), gender_session=registry.gender_session(), draw=False)
+    engine.set_gate_line(gate_line)
+
+    read_from = max(0, start - overlap)
+    read_to = min(total_frames, end + overlap)
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, read_from)
+
+    crossings = []          # (frame, in delta, out delta)
+    prev_in = prev_out = 0
+    frame_idx = read_from
+    try:
+        while frame_idx < read_to:
+            if _worker["cancel"].is_set():
+                break
+            ret, frame = cap.read()
+            if not ret:
+                break
+            _, _, in_count, out_count = engine.analyze_frame(frame, frame_idx)
+            if start <= frame_idx < end and (in_count != prev_in or out_count != prev_out):
+                crossings.append((frame_idx, in_count - prev_in, out_count - prev_out))
+            prev_in, prev_out = in_count, out_count
+
+            frame_idx += 1
+            if frame_idx % 25 == 0:
+                _worker["progress"].put((index, frame_idx - read_from))
+        engine.flush_pending_entries()
+    finally:
+        cap.release()
+    _worker["progress"].put((index, frame_idx - read_from))
+
+    return {
+        "index": index,
+        "crossings": crossings,
+        "entries": [(f, gender) for f, _, gender in engine.entry_log if start <= f < end],
+        "events": [event for event in engine.crossing_log if start <= event[0] < end],
+        "gender_stats": engine.gender_classifier.stats,
+        "required_votes": engine.gender_classifier.required_votes,
+    }
+
+
+def run_chunked(video_path, total_frames, fps, gate_line, workers, overlap, min_seconds=60,
+                on_progress=None, cancel=None):
+    """
+    Count one long video with a process pool, one TempleCounter per segment.
+
+    `on_progress(frames_done)` is called from the calling thread as workers
+    report in. Returns the merged result (see `merge_segments`), or None if
+    `cancel` was set.
+    """
+    segments = plan_segments(total_frames, fps, workers, min_seconds)
+    ctx = mp.get_context("spawn")   # CUDA and ORT sessions do not survive fork
+    progress_queue = ctx.Queue()
+    cancel_event = ctx.Event()
+    settings = {key: value for key, value in vars(config).items() if key.isupper()}
+
+    done_per_segment = [0] * len(segments)
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(segments)),
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(settings, progress_queue, cancel_event),
+    ) as pool:
+        pending = {
+            pool.submit(_process_segment, i, video_path, start, end, overlap, total_frames, gate_line)
+            for i, (start, end) in enumerate(segments)
+        }
+        results = []
+        while pending:
+            finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            results.extend(f.result() for f in finished)
+
+            if cancel is not None and cancel.is_set():
+                cancel_event.set()
+            try:
+                while True:
+                    index, done = progress_queue.get_nowait()
+                    done_per_segment[index] = done
+            except queue.Empty:
+                pass
+            if on_progress is not None:
+                on_progress(min(total_frames, sum(done_per_segment)))
+
+    if cancel is not None and cancel.is_set():
+        return None
+    return merge_segments(results, segments)
+
+
+def merge_segments(results, segments, sample_points=200):
+    """
+    Combine per-segment crossings and entries into job-level totals.
+
+    Segments only report events on frames they own, so totals are plain
+    sums; the timeline is rebuilt from the merged event stream at the same
+    ~200-point resolution a sequential run samples. `events` holds the
+    crossing-log records of all segments in frame order.
+    """
+    crossings = sorted(c for r in results for c in r["crossings"])
+    entries = sorted(e for r in results for e in r["entries"])
+    events = sorted((e for r in results for e in r["events"]), key=lambda e: e[0])
+    total_frames = segments[-1][1] if segments else 0
+
+    totals = {"in_count": 0, "out_count": 0, "male": 0, "female": 0, "unknown": 0}
+    timeline = []
+    sample_interval = max(1, total_frames // sample_points)
+    ci = ei = 0
+    for frame in range(0, total_frames, sample_interval):
+        while ci < len(crossings) and crossings[ci][0] <= frame:
+            totals["in_count"] += crossings[ci][1]
+            totals["out_count"] += crossings[ci][2]
+            ci += 1
+        while ei < len(entries) and entries[ei][0] <= frame:
+            _add_gender(totals, entries[ei][1])
+            ei += 1
+        timeline.append(dict(frame=frame, **totals))
+    for _, d_in, d_out in crossings[ci:]:
+        totals["in_count"] += d_in
+        totals["out_count"] += d_out
+    for _, gender in entries[ei:]:
+        _add_gender(totals, gender)
+    timeline.append(dict(frame=total_frames, **totals))
+
+    gender_stats = {}
+    for r in results:
+        for key, value in r["gender_stats"].items():
+            gender_stats[key] = gender_stats.get(key, 0) + value
+    if results:
+        required_votes = results[0]["required_votes"]
+        gender_stats["calls_saved"] = gender_stats["resolved"] * required_votes - gender_stats["votes_on_resolved"]
+        gender_stats["votes_per_resolved"] = (
+            gender_stats["votes_on_resolved"] / gender_stats["resolved"] if gender_stats["resolved"] else 0.0
+        )
+
+    return dict(
+        totals, timeline=timeline, gender_stats=gender_stats, events=events, segments=[list(s) for s in segments],
+    )
+
+
+def _add_gender(totals, gender):
+    if gender == "Male":
+        totals["male"] += 1
+    elif gender == "Female":
+        totals["female"] += 1
+    else:
+        totals["unknown"] += 1
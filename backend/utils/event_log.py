@@ -0,0 +1,178 @@
+import glob
+import os
+import time
+
+import numpy as np
+
+# One record per gate crossing. IN records are written once the entry's
+# gender is tallied (as Unknown if the job ends first); OUT records as soon
+# as the track crosses.
+EVENT_DTYPE = np.dtype([
+    ("frame", "<i8"),
+    ("timestamp", "<f8"),       # unix seconds
+    ("track_id", "<i8"),
+    ("direction", "i1"),        # +1 IN, -1 OUT
+    ("gender", "i1"),           # see GENDER_CODES
+    ("confidence", "<f4"),      # gender confidence, NaN if not classified
+    ("x", "<f4"),               # track centroid at the crossing
+    ("y", "<f4"),
+])
+DIRECTION_CODES = {"IN": 1, "OUT": -1}
+GENDER_CODES = {None: 0, "Male": 1, "Female": 2, "Unknown": 3}
+
+EVENT_LOG_SUFFIX = ".crossings.npy"
+
+# Fixed-size .npy header, rewritten in place as records are appended
+_HEADER_LEN = 256
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def event_log_path(log_dir, job_id, stream=None):
+    """Log of one job, or of one source of a multi-source live job."""
+    name = job_id if stream is None else f"{job_id}-{stream}"
+    return os.path.join(log_dir, f"{name}{EVENT_LOG_SUFFIX}")
+
+
+def job_event_logs(log_dir, job_id):
+    """Every log written by `job_id` (one per source for multi-source jobs)."""
+    paths = glob.glob(os.path.join(log_dir, f"{glob.escape(job_id)}-*{EVENT_LOG_SUFFIX}"))
+    single = event_log_path(log_dir, job_id)
+    return sorted(paths + [single] if os.path.exists(single) else paths)
+
+
+class CrossingEventLog:
+    """
+    Append-only crossing-event log in the .npy format.
+
+    Records are buffered and appended every `flush_events` records or
+    `flush_seconds`, then the header's record count is rewritten, so the
+    file is always a valid array of the records written so far: readers
+    (including `np.load(path, mmap_mode="r")`) can open it while the job
+    is still running, and a crash loses at most the unflushed buffer.
+
+    Timestamps are `start_time + frame / fps`; with `fps=None` (live
+    sources) they are the records' own wall-clock time of the crossing.
+    """
+
+    def __init__(self, path, start_time=None, fps=None, flush_events=64, flush_seconds=5.0):
+        self.path = path
+        self.start_time = time.time() if start_time is None else start_time
+        self.fps = fps
+        self.flush_events = max(1, flush_events)
+        self.flush_seconds = flush_seconds
+        self.count = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._file = open(path, "wb")
+        self._write_header()
+
+    def extend(self, records):
+        """Add (frame, wall_time, track_id, direction, gender, confidence, x, y) records."""
+        if records:
+            for frame, wall_time, track_id, direction, gender, confidence, x, y in records:
+                timestamp = self.start_time + frame / self.fps if self.fps else wall_time
+                self._buffer.append((
+                    frame, timestamp, track_id, DIRECTION_CODES[direction],
+                    GENDER_CODES.get(gender, 0), np.nan if confidence is None else confidence, x, y,
+                ))
+        if len(self._buffer) >= self.flush_events or (
+            self._buffer and time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        records = np.array(self._buffer, dtype=EVENT_DTYPE)
+        self._buffer.clear()
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(records.tobytes())
+        self._file.flush()
+        self.count += len(records)
+        self._write_header()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def _write_header(self):
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(EVENT_DTYPE),
+            "fortran_order": False,
+            "shape": (self.count,),
+        }).encode("latin1")
+        pad = _HEADER_LEN - len(_MAGIC) - 2 - len(header) - 1
+        self._file.seek(0)
+        self._file.write(_MAGIC + (_HEADER_LEN - len(_MAGIC) - 2).to_bytes(2, "little") + header + b" " * pad + b"\n")
+        self._file.flush()
+
+
+def read_events(path):
+    """Memory-mapped records of one log (empty array while nothing is flushed)."""
+    with open(path, "rb") as f:
+        np.lib.format.read_magic(f)
+        shape, _, _ = np.lib.format.read_array_header_1_0(f)
+    if shape[0] == 0:
+        return np.empty(0, dtype=EVENT_DTYPE)
+    return np.load(path, mmap_mode="r")
+
+
+def aggregate_events(paths, bucket_seconds=3600, start=None, end=None):
+    """
+    Per-time-bucket totals over one or more event logs.
+
+    Buckets are aligned to multiples of `bucket_seconds` since the epoch
+    (UTC hours for 3600); `start`/`end` bound the timestamps (unix seconds,
+    end exclusive). Returns [{start, in_count, out_count, male, female,
+    unknown}] for non-empty buckets in time order; demographics count IN
+    events only, like the live tallies.
+    """
+    columns = {"timestamp": [], "direction": [], "gender": []}
+    for path in paths:
+        events = read_events(path)
+        if not len(events):
+            continue
+        timestamps = events["timestamp"]
+        keep = np.ones(len(events), dtype=bool)
+        if start is not None:
+            keep &= timestamps >= start
+        if end is not None:
+            keep &= timestamps < end
+        for name, values in columns.items():
+            values.append(np.asarray(events[name][keep]))
+
+    if not columns["timestamp"] or not sum(len(v) for v in columns["timestamp"]):
+        return []
+    timestamps, direction, gender = (np.concatenate(columns[name]) for name in ("timestamp", "direction", "gender"))
+
+    keys = np.floor(timestamps / bucket_seconds).astype(np.int64)
+    buckets, inverse = np.unique(keys, return_inverse=True)
+    entered = direction == DIRECTION_CODES["IN"]
+
+    def count(mask):
+        return np.bincount(inverse[mask], minlength=len(buckets)).tolist()
+
+    in_count = count(entered)
+    out_count = count(direction == DIRECTION_CODES["OUT"])
+    male = count(entered & (gender == GENDER_CODES["Male"]))
+    female = count(entered & (gender == GENDER_CODES["Female"]))
+    unknown = [n - m - f for n, m, f in zip(in_count, male, female)]
+
+    return [
+        {
+            "start": int(bucket) * bucket_seconds,
+            "in_count": in_count[i],
+            "out_count": out_count[i],
+            "male": male[i],
+            "female": female[i],
+            "unknown": unknown[i],
+        }
+        for i, bucket in enumerate(buckets.tolist())
+    ]
+
+
+def list_event_logs(log_dir):
+    return sorted(glob.glob(os.path.join(log_dir, f"*{EVENT_LOG_SUFFIX}")))
@@ -0,0 +1,200 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SQLiteJobBackend:
+    """Durable job records: one row per job, indexed by id, filename and status."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id     TEXT PRIMARY KEY,
+                    filename   TEXT NOT NULL,
+                    status     TEXT NOT NULL,
+                    done       INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    data       TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_filename ON jobs(filename, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+
+    def save(self, job_id, job):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO jobs (job_id, filename, status, done, created_at, updated_at, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(job_id) DO UPDATE SET
+                    status = excluded.status,
+                    done = excluded.done,
+                    updated_at = excluded.updated_at,
+                    data = excluded.data
+                """,
+                (job_id, job["filename"], job["status"], int(job["done"]), now, now, json.dumps(job)),
+            )
+
+    def load(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row is not None
+
+    def query(self, filename=None, status=None, limit=50):
+        """Newest-first job summaries, filtered on the indexed columns."""
+        clauses, params = [], []
+        if filename is not None:
+            clauses.append("filename = ?")
+            params.append(filename)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT job_id, filename, status, created_at, updated_at FROM jobs {where} "
+                "ORDER BY created_at DESC LIMIT ?",
+                params,
+            ).fetchall()
+        return [
+            {"job_id": r[0], "filename": r[1], "status": r[2], "created_at": r[3], "updated_at": r[4]}
+            for r in rows
+        ]
+
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT job_id FROM jobs WHERE done = 0").fetchall()
+        return [r[0] for r in rows]
+
+
+class JobStore:
+    """
+    Dict-like job store: a bounded in-memory hot set over a durable backend.
+
+    Running jobs are always kept in memory (the pipeline mutates them in
+    place); finished jobs are evicted once older than `ttl` seconds or when
+    the hot set exceeds `max_hot` (least recently used first), and are
+    reloaded from the backend on access. Call `save(job_id)` after state
+    transitions to persist them. With `backend=None` nothing is persisted
+    and evicted jobs are gone.
+    """
+
+    def __init__(self, backend=None, max_hot=200, ttl=3600):
+        self.backend = backend
+        self.max_hot = max_hot
+        self.ttl = ttl
+        self._hot = OrderedDict()
+        self._finished_at = {}
+        self._lock = threading.RLock()
+
+    # ── dict protocol used by the server ─────────────────────────────────────
+    def __setitem__(self, job_id, job):
+        with self._lock:
+            self._hot[job_id] = job
+            self._hot.move_to_end(job_id)
+        self.save(job_id)
+
+    def __getitem__(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def __contains__(self, job_id):
+        with self._lock:
+            if job_id in self._hot:
+                return True
+        return self.backend is not None and self.backend.exists(job_id)
+
+    def get(self, job_id, default=None):
+        with self._lock:
+            job = self._hot.get(job_id)
+            if job is not None:
+                self._hot.move_to_end(job_id)
+                return job
+
+        job = self.backend.load(job_id) if self.backend is not None else None
+        if job is None:
+            return default
+
+        with self._lock:
+            self._hot[job_id] = job
+            if job["done"]:
+                self._finished_at.setdefault(job_id, time.time())
+            self._evict()
+        return job
+
+    def items(self):
+        """Snapshot of the in-memory jobs (all running and queued jobs are here)."""
+        with self._lock:
+            return list(self._hot.items())
+
+    # ── persistence ──────────────────────────────────────────────────────────
+    def save(self, job_id):
+        with self._lock:
+            job = self._hot.get(job_id)
+            if job is None:
+                return
+            if job["done"]:
+                self._finished_at.setdefault(job_id, time.time())
+            self._evict()
+        if self.backend is not None:
+            self.backend.save(job_id, job)
+
+    def query(self, filename=None, status=None, limit=50):
+        if self.backend is not None:
+            return self.backend.query(filename=filename, status=status, limit=limit)
+
+        # Memory-only: best effort over whatever is still hot
+        matches = [
+            {"job_id": job_id, "filename": job["filename"], "status": job["status"]}
+            for job_id, job in reversed(self.items())
+            if filename in (None, job["filename"]) and status in (None, job["status"])
+        ]
+        return matches[:limit]
+
+    def recover(self, on_interrupted):
+        """Hand jobs left unfinished by a previous process to `on_interrupted(job)` and persist them."""
+        if self.backend is None:
+            return
+        for job_id in self.backend.unfinished():
+            job = self.get(job_id)
+            if job is not None and not job["done"]:
+                on_interrupted(job)
+                self.save(job_id)
+
+    def _evict(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, finished in self._finished_at.items()
+            if now - finished > self.ttl
+        ]
+        for job_id in expired:
+            self._hot.pop(job_id, None)
+            del self._finished_at[job_id]
+
+        # LRU order: oldest access first; never evict jobs that are still running
+        for job_id in list(self._hot):
+            if len(self._hot) <= self.max_hot:
+                break
+            if job_id in self._finished_at:
+                del self._hot[job_id]
+                del self._finished_at[job_id]
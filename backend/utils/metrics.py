@@ -0,0 +1,141 @@
+import time
+from collections import deque
+
+
+class JobMetrics:
+    """
+    Rolling performance metrics for one running job.
+
+    `tick(frames_done)` is called as frames complete (cheap); `due()` says
+    whether `interval` seconds have passed since the last `snapshot()`, which
+    gathers rolling FPS over the last `fps_window` seconds, ETA, per-stage
+    timings from a StageProfiler, gender ONNX calls per frame since the
+    previous snapshot, active tracks and GenderClassifier cache sizes.
+    """
+
+    def __init__(self, total_frames=None, fps_window=10.0, interval=1.0):
+        self.total_frames = total_frames
+        self.fps_window = fps_window
+        self.interval = interval
+        self._ticks = deque()           # (time, frames_done)
+        self._last_snapshot = 0.0
+        self._last_onnx = None          # (frames_done, session_runs) at the previous snapshot
+
+    def tick(self, frames_done):
+        now = time.perf_counter()
+        self._ticks.append((now, frames_done))
+        while len(self._ticks) > 2 and now - self._ticks[0][0] > self.fps_window:
+            self._ticks.popleft()
+
+    def due(self):
+        return time.perf_counter() - self._last_snapshot >= self.interval
+
+    def fps(self):
+        if len(self._ticks) < 2:
+            return 0.0
+        (t0, f0), (t1, f1) = self._ticks[0], self._ticks[-1]
+        return (f1 - f0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def snapshot(self, engine=None, profiler=None):
+        self._last_snapshot = time.perf_counter()
+        frames_done = self._ticks[-1][1] if self._ticks else 0
+        fps = self.fps()
+
+        metrics = {
+            "fps": round(fps, 2),
+            "frames_done": frames_done,
+            "eta_s": None,
+            "stages": {},
+            "onnx_calls_per_frame": None,
+            "active_tracks": None,
+            "gender_cache": None,
+        }
+        if self.total_frames and fps > 0:
+            metrics["eta_s"] = round(max(0, self.total_frames - frames_done) / fps, 1)
+
+        if profiler is not None:
+            metrics["stages"] = {
+                name: {key: stats[key] for key in ("frames", "total_s", "mean_ms", "p50_ms", "p90_ms", "p99_ms")}
+                for name, stats in profiler.summary().items()
+            }
+
+        if engine is not None:
+            classifier = engine.gender_classifier
+            runs = classifier.stats["session_runs"]
+            if self._last_onnx is not None and frames_done > self._last_onnx[0]:
+                metrics["onnx_calls_per_frame"] = round(
+                    (runs - self._last_onnx[1]) / (frames_done - self._last_onnx[0]), 3
+                )
+            self._last_onnx = (frames_done, runs)
+            metrics["active_tracks"] = len(engine.counter.track_ids or [])
+            metrics["gender_cache"] = classifier.cache_sizes()
+
+        return metrics
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(job_metrics, scheduler_stats, live_streams):
+    """
+    Prometheus text exposition for running jobs.
+
+    `job_metrics` maps job_id -> (job dict, JobMetrics snapshot dict).
+    """
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value, *suffix in samples:
+            if value is None:
+                continue
+            sample = name + (suffix[0] if suffix else "")
+            label_str = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f"{sample}{{{label_str}}} {value}" if label_str else f"{sample} {value}")
+
+    family("temple_jobs_running", "gauge", "Jobs currently processing on the worker pool.",
+           [({}, scheduler_stats["running"])])
+    family("temple_jobs_queued", "gauge", "Jobs waiting for a worker.",
+           [({}, scheduler_stats["queued"])])
+    family("temple_live_streams", "gauge", "Live sources being counted.",
+           [({}, live_streams)])
+
+    def per_job(key):
+        return [
+            ({"job_id": job_id, "filename": job["filename"]}, metrics[key])
+            for job_id, (job, metrics) in job_metrics.items()
+        ]
+
+    family("temple_job_fps", "gauge", "Rolling processing frames per second.", per_job("fps"))
+    family("temple_job_frames_done", "gauge", "Frames processed so far.", per_job("frames_done"))
+    family("temple_job_eta_seconds", "gauge", "Estimated seconds until the job finishes.", per_job("eta_s"))
+    family("temple_job_active_tracks", "gauge", "Tracks visible in the latest frame.", per_job("active_tracks"))
+    family("temple_job_onnx_calls_per_frame", "gauge", "Gender ONNX session runs per frame since the last update.",
+           per_job("onnx_calls_per_frame"))
+    family("temple_job_counts", "gauge", "Running IN/OUT and demographic tallies.", [
+        ({"job_id": job_id, "filename": job["filename"], "count": key}, job[key])
+        for job_id, (job, _) in job_metrics.items()
+        for key in ("in_count", "out_count", "male", "female", "unknown")
+    ])
+    # Quantiles cover the recent window; _sum and _count every frame of the job so far
+    family("temple_job_stage_seconds", "summary", "Per-frame stage latency over the recent window.", [
+        sample
+        for job_id, (_, metrics) in job_metrics.items()
+        for stage, stats in metrics["stages"].items()
+        for sample in [
+            *(
+                ({"job_id": job_id, "stage": stage, "quantile": q}, round(stats[key] / 1000.0, 6))
+                for q, key in (("0.5", "p50_ms"), ("0.9", "p90_ms"), ("0.99", "p99_ms"))
+            ),
+            ({"job_id": job_id, "stage": stage}, stats["total_s"], "_sum"),
+            ({"job_id": job_id, "stage": stage}, stats["frames"], "_count"),
+        ]
+    ])
+    family("temple_job_gender_cache_entries", "gauge", "GenderClassifier per-track state sizes.", [
+        ({"job_id": job_id, "cache": cache}, size)
+        for job_id, (_, metrics) in job_metrics.items()
+        for cache, size in (metrics["gender_cache"] or {}).items()
+    ])
+    return "\n".join(lines) + "\n"
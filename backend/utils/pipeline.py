@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+
+from utils.profiling import NULL_PROFILER
+
+_END = object()
+
+
+class StageStats:
+    """Frame count and busy time for one pipeline stage."""
+
+    def __init__(self):
+        self.frames = 0
+        self.busy = 0.0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.busy += seconds
+
+    def as_dict(self, wall):
+        return {
+            "frames": self.frames,
+            # What the stage could sustain on its own vs what it actually delivered
+            "capacity_fps": round(self.frames / self.busy, 2) if self.busy > 0 else 0.0,
+            "fps": round(self.frames / wall, 2) if wall > 0 else 0.0,
+            "busy_pct": round(100.0 * self.busy / wall, 1) if wall > 0 else 0.0,
+        }
+
+
+class QueueStats:
+    """Occupancy samples for a bounded queue, taken on every put."""
+
+    def __init__(self, q):
+        self.q = q
+        self.samples = 0
+        self.total = 0
+        self.peak = 0
+
+    def sample(self):
+        size = self.q.qsize()
+        self.samples += 1
+        self.total += size
+        self.peak = max(self.peak, size)
+
+    def as_dict(self):
+        return {
+            "size": self.q.qsize(),
+            "capacity": self.q.maxsize,
+            "avg": round(self.total / self.samples, 2) if self.samples else 0.0,
+            "peak": self.peak,
+        }
+
+
+class FramePipeline:
+    """
+    Decode -> process -> sink over bounded queues.
+
+    `cap.read()` runs on a decode thread and `sink(item)` (annotate + encode)
+    on a writer thread; both spend most of their time inside OpenCV with the
+    GIL released, so they overlap with `process(frame_idx, frame)`, which runs
+    on the calling thread. Full queues block the producer (backpressure), so
+    memory stays bounded at roughly 2 * queue_size frames.
+    """
+
+    def __init__(self, cap, process, sink, queue_size=8, profiler=None):
+        self.cap = cap
+        self.process = process
+        self.sink = sink
+        self.profiler = profiler or NULL_PROFILER
+
+        self._decoded = queue.Queue(maxsize=queue_size)
+        self._processed = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+
+        self.stage_stats = {
+            "decode": StageStats(),
+            "process": StageStats(),
+            "sink": StageStats(),
+        }
+        self.queue_stats = {
+            "decoded": QueueStats(self._decoded),
+            "processed": QueueStats(self._processed),
+        }
+        self._started = None
+        self._finished = None
+
+    def run(self):
+        """Run until the source is exhausted or `stop()` is called. Returns frames processed."""
+        self._started = time.perf_counter()
+        decoder = threading.Thread(target=self._guard, args=(self._decode_loop,), daemon=True)
+        writer = threading.Thread(target=self._sink_loop, daemon=True)
+        decoder.start()
+        writer.start()
+
+        try:
+            self._process_loop()
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # The writer always gets its sentinel, even on failure, so it can drain and exit
+            self._put(self._processed, "processed", _END, force=True)
+            writer.join()
+            self._stop.set()
+            decoder.join()
+            self._finished = time.perf_counter()
+
+        if self._error is not None:
+            raise self._error
+        return self.stage_stats["process"].frames
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        end = self._finished or time.perf_counter()
+        wall = end - self._started if self._started else 0.0
+        return {
+            "wall_s": round(wall, 2),
+            "stages": {name: s.as_dict(wall) for name, s in self.stage_stats.items()},
+            "queues": {name: q.as_dict() for name, q in self.queue_stats.items()},
+        }
+
+    # ── stages ───────────────────────────────────────────────────────────────
+    def _decode_loop(self):
+        frame_idx = 0
+        stats = self.stage_stats["decode"]
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            elapsed = time.perf_counter() - t0
+            stats.add(elapsed)
+            self.profiler.add("decode", elapsed)
+            self.profiler.end_frame()
+            if not self._put(self._decoded, "decoded", (frame_idx, frame)):
+                return
+            frame_idx += 1
+        self._put(self._decoded, "decoded", _END)
+
+    def _process_loop(self):
+        stats = self.stage_stats["process"]
+        while True:
+            item = self._get(self._decoded)
+            if item is _END or item is None:
+                return
+            frame_idx, frame = item
+            t0 = time.perf_counter()
+            result = self.process(frame_idx, frame)
+            stats.add(time.perf_counter() - t0)
+            self.profiler.end_frame()
+            if not self._put(self._processed, "processed", result):
+                return
+
+    def _sink_loop(self):
+        stats = self.stage_stats["sink"]
+        while True:
+            # Drain everything already queued, even after a stop request
+            item = self._processed.get()
+            if item is _END:
+                return
+            if self._error is not None:
+                continue
+            t0 = time.perf_counter()
+            try:
+                self.sink(item)
+            except BaseException as e:
+                self._fail(e)
+                continue
+            stats.add(time.perf_counter() - t0)
+            self.profiler.end_frame()
+
+    # ── plumbing ─────────────────────────────────────────────────────────────
+    def _guard(self, loop):
+        try:
+            loop()
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _put(self, q, name, item, force=False):
+        """Blocking put that gives up when the pipeline is stopped (unless forced)."""
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                q.put(item, timeout=0.1)
+                if item is not _END:
+                    self.queue_stats[name].sample()
+                return True
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+
+class StageProfiler:
+    """
+    Per-stage latency samples for the counting pipeline.
+
+    Time spent under `with profiler.stage(name)` accumulates into the calling
+    thread's current frame; `end_frame()` turns those sums into one sample per
+    stage, so a stage entered several times in a frame (e.g. one ONNX call
+    per batch chunk) is reported as its per-frame cost. Percentiles cover the
+    frames in which a stage ran. `window` bounds the samples kept per stage
+    (None keeps all of them, for benchmarks).
+    """
+
+    def __init__(self, window=None):
+        self.window = window
+        self._samples = {}      # name -> deque of per-frame seconds
+        self._totals = {}       # name -> [frames, seconds]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name, seconds):
+        pending = self._pending()
+        pending[name] = pending.get(name, 0.0) + seconds
+
+    def end_frame(self):
+        pending = self._pending()
+        if not pending:
+            return
+        with self._lock:
+            for name, seconds in pending.items():
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.window)
+                samples.append(seconds)
+                total = self._totals.setdefault(name, [0, 0.0])
+                total[0] += 1
+                total[1] += seconds
+        pending.clear()
+
+    def summary(self):
+        """{stage: {frames, total_s, mean_ms, p50_ms, p90_ms, p99_ms, max_ms}}"""
+        with self._lock:
+            samples = {name: np.fromiter(s, dtype=np.float64) for name, s in self._samples.items()}
+            totals = {name: tuple(t) for name, t in self._totals.items()}
+
+        out = {}
+        for name, values in samples.items():
+            frames, seconds = totals[name]
+            p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000.0
+            out[name] = {
+                "frames": frames,
+                "total_s": round(seconds, 3),
+                "mean_ms": round(1000.0 * seconds / frames, 3),
+                "p50_ms": round(float(p50), 3),
+                "p90_ms": round(float(p90), 3),
+                "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(values.max()) * 1000.0, 3),
+            }
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def _pending(self):
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            pending = self._local.pending = {}
+        return pending
+
+
+class _NullProfiler:
+    """Stand-in when profiling is off: `stage()` costs one nullcontext."""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, seconds):
+        pass
+
+    def end_frame(self):
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+# Scalar job fields streamed to dashboards; list fields are sent as appends
+STATUS_FIELDS = (
+    "status", "queue_position", "frame", "total_frames",
+    "in_count", "out_count", "male", "female", "unknown",
+    "fps", "output_file", "pipeline", "metrics", "live", "streams", "done",
+)
+APPEND_FIELDS = ("warnings", "errors")
+
+
+class ProgressHub:
+    """
+    Publish/subscribe progress channel between pipeline threads and SSE clients.
+
+    Pipeline threads call `publish(job_id)` after mutating a job; this only
+    flags the job and wakes subscribers on the event loop (repeated publishes
+    before the loop runs collapse into one wake-up). Each subscriber then
+    sends what changed since its last event - changed scalar fields plus new
+    warnings/errors - at most `max_rate` times per second.
+    """
+
+    def __init__(self, max_rate=4.0, keepalive=15.0):
+        self.max_rate = max_rate
+        self.keepalive = keepalive
+        self._loop = None
+        self._subscribers = defaultdict(set)   # job_id -> {asyncio.Event}
+        self._scheduled = set()
+        self._lock = threading.Lock()
+
+    def bind(self, loop):
+        """Attach to the server's event loop (call once at startup)."""
+        self._loop = loop
+
+    def publish(self, job_id):
+        if self._loop is None:
+            return
+        with self._lock:
+            if job_id in self._scheduled:
+                return
+            self._scheduled.add(job_id)
+        try:
+            self._loop.call_soon_threadsafe(self._wake, job_id)
+        except RuntimeError:
+            # Loop closed during shutdown
+            with self._lock:
+                self._scheduled.discard(job_id)
+
+    def _wake(self, job_id):
+        with self._lock:
+            self._scheduled.discard(job_id)
+        for event in self._subscribers.get(job_id, ()):
+            event.set()
+
+    async def stream(self, job_id, get_job):
+        """
+        Async generator of SSE frames for one client.
+
+        The first event is a full snapshot; later ones are deltas. `get_job`
+        returns the current job dict (or None once it is gone).
+        """
+        event = asyncio.Event()
+        self._subscribers[job_id].add(event)
+        min_interval = 1.0 / self.max_rate if self.max_rate > 0 else 0.0
+
+        try:
+            job = get_job(job_id)
+            if job is None:
+                return
+            sent = {field: _copy(job.get(field)) for field in STATUS_FIELDS}
+            sent_lengths = {field: len(job[field]) for field in APPEND_FIELDS}
+            snapshot = dict(sent, event="snapshot")
+            snapshot.update({field: list(job[field]) for field in APPEND_FIELDS})
+            yield f"data: {json.dumps(snapshot)}\n\n"
+
+            while not sent["done"]:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                event.clear()
+
+                job = get_job(job_id)
+                if job is None:
+                    return
+
+                delta = {}
+                for field in STATUS_FIELDS:
+                    value = job.get(field)
+                    if value != sent[field]:
+                        delta[field] = sent[field] = _copy(value)
+                for field in APPEND_FIELDS:
+                    items = job[field]
+                    if len(items) > sent_lengths[field]:
+                        delta[field] = items[sent_lengths[field]:]
+                        sent_lengths[field] = len(items)
+
+                if delta:
+                    delta["event"] = "delta"
+                    yield f"data: {json.dumps(delta)}\n\n"
+
+                # Rate limit; publishes arriving meanwhile coalesce into the next delta
+                if min_interval and not sent["done"]:
+                    await asyncio.sleep(min_interval)
+        finally:
+            self._subscribers[job_id].discard(event)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+
+def _copy(value):
+    # Nested dicts and lists (pipeline stats, streams) are replaced wholesale, so a shallow copy is enough
+    return dict(value) if isinstance(value, dict) else value
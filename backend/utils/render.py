@@ -0,0 +1,69 @@
+from collections import deque
+
+RENDER_MODES = ("full", "sampled", "events", "none")
+
+
+class FrameSelector:
+    """
+    Decides which processed frames are rendered to the output video.
+
+    - "full":    every frame
+    - "sampled": every `sample_every`-th frame (a condensed time-lapse)
+    - "events":  short clips around crossing events, `pre` frames before
+                 and `post` frames after each one (overlapping clips merge)
+    - "none":    nothing; analytics only
+
+    `push(frame_idx, item, crossed)` must be called in frame order and
+    returns the items to write now. In "events" mode up to `pre` items are
+    held back so a clip can start before the crossing that triggers it.
+    `clips` lists the [first, last] source frame of every rendered run.
+    """
+
+    def __init__(self, mode="full", sample_every=25, pre=25, post=50):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {mode}")
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.post = post
+        self.clips = []
+        self._pending = deque(maxlen=max(0, pre))   # (frame_idx, item)
+        self._write_until = -1
+
+    @property
+    def writes_video(self):
+        return self.mode != "none"
+
+    def push(self, frame_idx, item, crossed=False):
+        if self.mode == "full":
+            self._extend_clip(frame_idx)
+            return [item]
+        if self.mode == "none":
+            return []
+        if self.mode == "sampled":
+            if frame_idx % self.sample_every:
+                return []
+            self._extend_clip(frame_idx, gap=self.sample_every)
+            return [item]
+
+        # "events"
+        if crossed:
+            self._write_until = frame_idx + self.post
+        if frame_idx > self._write_until:
+            if self._pending.maxlen:
+                self._pending.append((frame_idx, item))
+            return []
+
+        out = []
+        for idx, held in self._pending:
+            self._extend_clip(idx)
+            out.append(held)
+        self._pending.clear()
+        self._extend_clip(frame_idx)
+        out.append(item)
+        return out
+
+    def _extend_clip(self, frame_idx, gap=1):
+        if self.clips and frame_idx - self.clips[-1][1] <= gap:
+            self.clips[-1][1] = frame_idx
+        else:
+            self.clips.append([frame_idx, frame_idx])
@@ -0,0 +1,100 @@
+import heapq
+import itertools
+import threading
+
+
+class JobScheduler:
+    """
+    Bounded worker pool with a priority queue in front of it.
+
+    At most `workers` jobs run at once; the rest wait in priority order
+    (lower value first, FIFO within a priority). `run_job(job_id, cancel)`
+    is called on a worker thread with a threading.Event that is set when the
+    job is cancelled mid-run. `on_queue_change(positions)` receives
+    {job_id: 1-based position} for every waiting job whenever the queue moves.
+    """
+
+    def __init__(self, run_job, workers=2, on_queue_change=None):
+        self.run_job = run_job
+        self.workers = max(1, workers)
+        self.on_queue_change = on_queue_change
+
+        self._heap = []                 # (priority, seq, job_id)
+        self._seq = itertools.count()
+        self._cancelled = set()         # queued job_ids removed lazily from the heap
+        self._running = {}              # job_id -> cancel Event
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job_id, priority=0):
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._seq), job_id))
+            self._notify_positions()
+            self._cond.notify()
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns 'queued', 'running' or None if unknown."""
+        with self._cond:
+            if job_id in self._running:
+                self._running[job_id].set()
+                return "running"
+            if any(entry[2] == job_id for entry in self._heap) and job_id not in self._cancelled:
+                self._cancelled.add(job_id)
+                self._notify_positions()
+                return "queued"
+        return None
+
+    def position(self, job_id):
+        with self._cond:
+            return self._positions().get(job_id)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": len(self._running),
+                "queued": len(self._positions()),
+            }
+
+    # ── internals (call with self._cond held) ────────────────────────────────
+    def _positions(self):
+        waiting = [entry for entry in sorted(self._heap) if entry[2] not in self._cancelled]
+        return {job_id: i + 1 for i, (_, _, job_id) in enumerate(waiting)}
+
+    def _notify_positions(self):
+        if self.on_queue_change is not None:
+            self.on_queue_change(self._positions())
+
+    def _next_job(self):
+        while True:
+            while not self._heap:
+                self._cond.wait()
+            _, _, job_id = heapq.heappop(self._heap)
+            if job_id in self._cancelled:
+                self._cancelled.discard(job_id)
+                continue
+            cancel = threading.Event()
+            self._running[job_id] = cancel
+            self._notify_positions()
+            return job_id, cancel
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job_id, cancel = self._next_job()
+            try:
+                self.run_job(job_id, cancel)
+            except Exception as e:
+                print(f"Job {job_id} failed outside the pipeline: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
@@ -1,4 +1,10 @@
+import shutil
+import subprocess
+import threading
+from collections import deque
+
 import cv2
+import numpy as np
 
 def get_video_properties(video_path):
     cap = cv2.VideoCapture(video_path)
@@ -10,3 +16,76 @@ def get_video_properties(video_path):
 def create_video_writer(output_path, width, height, fps):
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     return cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+
+
+class FFmpegWriter:
+    """
+    cv2.VideoWriter-compatible writer that pipes raw BGR frames into a
+    persistent ffmpeg process encoding browser-ready H.264.
+
+    With `fragmented=True` the MP4 is written as self-contained fragments,
+    so the file is playable while it is still growing; otherwise the moov
+    atom is moved to the front (faststart) when the writer is released.
+    """
+
+    def __init__(self, output_path, width, height, fps, preset="fast", crf=23, fragmented=True):
+        self.output_path = output_path
+        movflags = "+frag_keyframe+empty_moov+default_base_moof" if fragmented else "+faststart"
+        self._proc = subprocess.Popen(
+            [
+                "ffmpeg", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "bgr24",
+                "-s", f"{width}x{height}", "-r", str(fps or 25),
+                "-i", "-",
+                "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+                "-pix_fmt", "yuv420p",
+                "-movflags", movflags,
+                "-an", "-y", output_path,
+            ],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        # Drained on a thread so a chatty encoder can never block on a full pipe
+        self._stderr = deque(maxlen=20)
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+    def isOpened(self):
+        return self._proc.poll() is None
+
+    def write(self, frame):
+        try:
+            self._proc.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, ValueError):
+            raise RuntimeError(f"ffmpeg encoder exited: {self.error_output()}")
+
+    def release(self):
+        if self._proc.stdin and not self._proc.stdin.closed:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        code = self._proc.wait()
+        self._stderr_thread.join()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg encoder failed ({code}): {self.error_output()}")
+
+    def error_output(self):
+        return "".join(self._stderr).strip()
+
+    def _drain_stderr(self):
+        for line in iter(self._proc.stderr.readline, b""):
+            self._stderr.append(line.decode(errors="replace"))
+        self._proc.stderr.close()
+
+
+def open_video_encoder(output_path, width, height, fps, backend="ffmpeg", preset="fast", crf=23, fragmented=True):
+    """
+    Open the output writer for annotated video.
+
+    Returns (writer, browser_ready). "ffmpeg" streams straight to H.264 and
+    needs no second pass; without an ffmpeg binary (or with backend
+    "opencv") it falls back to mp4v, which must be re-encoded for browsers.
+    """
+    if backend == "ffmpeg" and shutil.which("ffmpeg"):
+        return FFmpegWriter(output_path, width, height, fps, preset, crf, fragmented), True
+    return create_video_writer(output_path, width, height, fps), False
@@ -37,6 +37,7 @@ export default function DashboardPage() {
     fps: 0,
   });
 
+  const [queuePosition, setQueuePosition] = useState<number | null>(null);
   const [timeline, setTimeline] = useState<JobResults["timeline"]>([]);
   const [warnings, setWarnings] = useState<StatusUpdate["warnings"]>([]);
   const [errors, setErrors] = useState<StatusUpdate["errors"]>([]);
@@ -88,6 +89,7 @@ export default function DashboardPage() {
             total_frames: update.total_frames,
             fps: update.fps,
           });
+          setQueuePosition(update.queue_position);
           setWarnings(update.warnings);
           setErrors(update.errors);
         },
@@ -259,7 +261,11 @@ export default function DashboardPage() {
               {appState === "processing" && (
                 <div className="mt-4">
                   <div className="flex justify-between text-xs text-gray-500 mb-1.5">
-                    <span>Frame {stats.frame.toLocaleString()} / {stats.total_frames.toLocaleString()}</span>
+                    {queuePosition ? (
+                      <span>Queued — position {queuePosition}</span>
+                    ) : (
+                      <span>Frame {stats.frame.toLocaleString()} / {stats.total_frames.toLocaleString()}</span>
+                    )}
                     <span>{progress}%</span>
                   </div>
                   <div className="h-1.5 bg-gray-800 rounded-full overflow-hidden">
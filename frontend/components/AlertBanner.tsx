@@ -17,6 +17,7 @@ const laymanTitles: Record<string, string> = {
   LOW_FRAME_COUNT: "Video Too Short",
   CHAOTIC_MOTION: "Unstable Crowd Pattern",
   CHAOTIC_MOTION_WARN: "Crowd Movement Warning",
+  ENCODER_FAILED: "Video Not Saved",
   PIPELINE_ERROR: "Processing Error",
 };
 
@@ -20,19 +20,63 @@ export async function uploadVideo(file: File): Promise<string> {
   return data.filename;
 }
 
-export async function startProcessing(filename: string): Promise<string> {
+export type RenderMode = "full" | "sampled" | "events" | "none";
+
+export async function startProcessing(
+  filename: string,
+  render: RenderMode = "full",
+  chunked = false
+): Promise<string> {
   const res = await fetch(`${API_BASE}/api/process`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ filename }),
+    body: JSON.stringify({ filename, render, chunked }),
   });
   const data = await res.json();
   if (!res.ok) throw new Error(data.detail || "Failed to start processing");
   return data.job_id;
 }
 
+export async function cancelJob(jobId: string): Promise<void> {
+  const res = await fetch(`${API_BASE}/api/cancel/${jobId}`, { method: "POST" });
+  if (!res.ok) {
+    const data = await res.json();
+    throw new Error(data.detail || "Failed to cancel job");
+  }
+}
+
+export async function startLive(
+  source: string,
+  gateLine?: [[number, number], [number, number]]
+): Promise<string> {
+  const res = await fetch(`${API_BASE}/api/live`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ source, gate_line: gateLine ?? null }),
+  });
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.detail || "Failed to start live source");
+  return data.job_id;
+}
+
+export async function startLiveMulti(
+  streams: Array<{ source: string; gateLine?: [[number, number], [number, number]] }>
+): Promise<string> {
+  const res = await fetch(`${API_BASE}/api/live/multi`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      streams: streams.map((s) => ({ source: s.source, gate_line: s.gateLine ?? null })),
+    }),
+  });
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.detail || "Failed to start live sources");
+  return data.job_id;
+}
+
 export interface StatusUpdate {
   status: string;
+  queue_position: number | null;
   frame: number;
   total_frames: number;
   in_count: number;
@@ -41,22 +85,100 @@ export interface StatusUpdate {
   female: number;
   unknown: number;
   fps: number;
+  pipeline: PipelineStats | null;
+  metrics: JobMetrics | null;
+  live: LiveStats | MultiLiveStats | null;
+  streams: StreamStatus[] | null;
   warnings: Array<{ code: string; message: string; layman: string }>;
   errors: Array<{ code: string; message: string; layman: string }>;
   done: boolean;
 }
 
+export interface JobMetrics {
+  fps: number;
+  frames_done: number;
+  eta_s: number | null;
+  stages: Record<
+    string,
+    {
+      frames: number;
+      total_s: number;
+      mean_ms: number;
+      p50_ms: number;
+      p90_ms: number;
+      p99_ms: number;
+    }
+  >;
+  onnx_calls_per_frame: number | null;
+  active_tracks: number | null;
+  gender_cache: Record<string, number> | null;
+}
+
+export interface LiveStats {
+  connected: boolean;
+  reconnects: number;
+  frames_read: number;
+  frames_dropped: number;
+  source_fps: number;
+  processing_fps: number;
+}
+
+export interface MultiLiveStats {
+  sources: number;
+  connected: number;
+  processing_fps: number;
+  frames_per_batch: number;
+}
+
+export interface StreamStatus {
+  source: string;
+  status: string;
+  frame: number;
+  in_count: number;
+  out_count: number;
+  male: number;
+  female: number;
+  unknown: number;
+  live: Omit<LiveStats, "processing_fps"> | null;
+  event_log: string | null;
+}
+
+export interface PipelineStats {
+  wall_s: number;
+  stages: Record<
+    string,
+    { frames: number; capacity_fps: number; fps: number; busy_pct: number }
+  >;
+  queues: Record<
+    string,
+    { size: number; capacity: number; avg: number; peak: number }
+  >;
+}
+
 export function subscribeToStatus(
   jobId: string,
   onUpdate: (data: StatusUpdate) => void,
   onDone: () => void
 ): () => void {
   const eventSource = new EventSource(`${API_BASE}/api/status/${jobId}`);
+  let state: StatusUpdate | null = null;
 
   eventSource.onmessage = (event) => {
-    const data: StatusUpdate = JSON.parse(event.data);
-    onUpdate(data);
-    if (data.done) {
+    // First message is a full snapshot; later ones carry only changed fields
+    // plus newly added warnings/errors.
+    const { event: kind, ...fields } = JSON.parse(event.data);
+    if (kind === "snapshot" || state === null) {
+      state = fields as StatusUpdate;
+    } else {
+      state = {
+        ...state,
+        ...fields,
+        warnings: [...state.warnings, ...(fields.warnings ?? [])],
+        errors: [...state.errors, ...(fields.errors ?? [])],
+      };
+    }
+    onUpdate(state!);
+    if (state!.done) {
       eventSource.close();
       onDone();
     }
@@ -87,6 +209,51 @@ export interface JobResults {
   warnings: Array<{ code: string; message: string; layman: string }>;
   errors: Array<{ code: string; message: string; layman: string }>;
   output_file: string | null;
+  render: RenderMode;
+  clips: Array<[number, number]> | null;
+  event_log: string | null;
+  calibration: CalibrationResult | null;
+}
+
+export interface CalibrationCheck {
+  frame: number;
+  vectors: number;
+  ratio: number; // major/minor eigenvalue ratio of the motion vectors
+  angle: number; // flow axis in degrees, [0, 180)
+  center: [number, number];
+}
+
+export interface CalibrationResult {
+  status: "success" | "chaotic_motion" | "chaotic_motion_warn";
+  gate_line: [[number, number], [number, number]] | null;
+  ratio: number | null;
+  vectors_found: number;
+  frames_analyzed: number;
+  stopped: "converged" | "chaotic" | "frame_limit" | "end_of_video";
+  trace: CalibrationCheck[];
+}
+
+export interface EventBucket {
+  start: number; // unix seconds
+  in_count: number;
+  out_count: number;
+  male: number;
+  female: number;
+  unknown: number;
+}
+
+export async function fetchEventAggregates(
+  params: { bucket?: number; start?: number; end?: number; job_id?: string; filename?: string } = {}
+): Promise<EventBucket[]> {
+  const query = new URLSearchParams(
+    Object.entries(params)
+      .filter(([, value]) => value !== undefined)
+      .map(([key, value]) => [key, String(value)])
+  );
+  const res = await fetch(`${API_BASE}/api/events/aggregate?${query}`);
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.detail || "Failed to load event aggregates");
+  return data.buckets;
 }
 
 export async function fetchResults(jobId: string): Promise<JobResults> {